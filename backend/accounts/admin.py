@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Car, CarPhoto, Badge, UserBadge
+from .models import User, Car, CarPhoto, CarStats, Badge, UserBadge
 
 
 @admin.register(User)
@@ -40,6 +40,13 @@ class CarPhotoAdmin(admin.ModelAdmin):
     search_fields = ['car__brand', 'car__model']
 
 
+@admin.register(CarStats)
+class CarStatsAdmin(admin.ModelAdmin):
+    list_display = ['brand', 'model', 'generation', 'cars_count', 'photos_count', 'updated_at']
+    search_fields = ['brand', 'model', 'generation']
+    readonly_fields = ['cars_count', 'photos_count', 'updated_at']
+
+
 @admin.register(Badge)
 class BadgeAdmin(admin.ModelAdmin):
     list_display = ['name', 'event_name', 'is_active', 'created_at']
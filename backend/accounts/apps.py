@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class AccountsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'accounts'
+    
+    def ready(self):
+        # Подключаем обработчики сигналов и системные проверки
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,35 @@
+# Аутентификация API-клиентов по подписанному токену
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from .tokens import InvalidToken, verify_token
+from .user_cache import get_cached_user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Заголовок "Authorization: Bearer <access-токен>" (см. accounts/tokens.py).
+
+    Токен проверяется по подписи без запросов к базе, пользователь берется
+    из кэша пользователей. CSRF для таких запросов не нужен - токен не
+    отправляется браузером автоматически, в отличие от cookie сессии.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise AuthenticationFailed('Неверный заголовок Authorization')
+        try:
+            payload = verify_token(header[1].decode())
+        except (InvalidToken, UnicodeError) as e:
+            raise AuthenticationFailed(str(e))
+
+        user = get_cached_user(payload['uid'])
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('Пользователь не найден или заблокирован')
+        return (user, payload)
+
+    def authenticate_header(self, request):
+        return self.keyword
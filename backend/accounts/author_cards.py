@@ -0,0 +1,88 @@
+# Краткие карточки авторов для форума и мероприятий
+from django.db.models import Count
+from rest_framework import serializers
+from .models import User
+from .thumbnails import AVATAR_LIST_SIZE, get_avatar_url
+
+
+AUTHOR_CARDS_CONTEXT_KEY = 'author_cards'
+
+
+def load_author_cards(user_ids, request=None):
+    """
+    Загружает карточки авторов одним запросом.
+
+    Возвращает словарь {user_id: {"id", "username", "avatar_url", "badges_count"}},
+    где avatar_url - миниатюра размера AVATAR_LIST_SIZE.
+    """
+    users = User.objects.filter(
+        id__in=set(user_ids)
+    ).annotate(
+        badges_count=Count('badges')
+    ).only('id', 'username', 'avatar', 'has_avatar_thumbnails')
+    return {user.id: build_author_card(user, request) for user in users}
+
+
+def build_author_card(user, request=None):
+    # Карточка из уже загруженного пользователя
+    badges_count = getattr(user, 'badges_count', None)
+    if badges_count is None:
+        badges_count = user.badges.count()
+    return {
+        'id': user.id,
+        'username': user.username,
+        'avatar_url': get_avatar_url(user, AVATAR_LIST_SIZE, request),
+        'badges_count': badges_count,
+    }
+
+
+def get_author_card(context, user_id):
+    """
+    Карточка автора из контекста сериализатора.
+
+    Карточки, загруженные заранее (AuthorCardsMixin), и карточки, собранные
+    по ходу, хранятся в контексте, поэтому в одном ответе каждая строится
+    не больше одного раза.
+    """
+    if user_id is None:
+        return None
+    cards = context.setdefault(AUTHOR_CARDS_CONTEXT_KEY, {})
+    if user_id not in cards:
+        cards.update(load_author_cards([user_id], context.get('request')))
+    return cards.get(user_id)
+
+
+class AuthorCardField(serializers.Field):
+    """
+    Поле с краткой карточкой пользователя.
+    В source указывается id пользователя, например source='author_id',
+    чтобы сам пользователь не загружался для каждого объекта.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return get_author_card(self.context, value)
+
+
+class AuthorCardsMixin:
+    """
+    Миксин для ViewSet: перед сериализацией загружает карточки всех авторов
+    страницы одним запросом и кладет их в контекст сериализатора.
+
+    ViewSet указывает, откуда брать id пользователей, в get_author_ids.
+    """
+
+    def get_author_ids(self, instances):
+        return [instance.author_id for instance in instances]
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.request.method == 'GET':
+            instances = args[0] if kwargs.get('many') else [args[0]]
+            context = kwargs.setdefault('context', self.get_serializer_context())
+            context[AUTHOR_CARDS_CONTEXT_KEY] = load_author_cards(
+                self.get_author_ids(instances), self.request
+            )
+        return super().get_serializer(*args, **kwargs)
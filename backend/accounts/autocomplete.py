@@ -0,0 +1,128 @@
+# Подсказки марок, моделей и поколений для формы машины
+#
+# Различные значения марок, моделей и поколений (группы CarStats) загружаются
+# в префиксные деревья в памяти процесса. Подсказка на каждое нажатие клавиши
+# не обращается к базе: деревья перестраиваются, только когда в общем кэше
+# меняется версия - при появлении или исчезновении группы.
+import uuid
+from collections import Counter, defaultdict
+from django.core.cache import cache
+
+
+# Сколько подсказок возвращать
+AUTOCOMPLETE_LIMIT = 10
+# Версия подсказок в общем кэше
+AUTOCOMPLETE_VERSION_CACHE_KEY = 'car_autocomplete:version'
+AUTOCOMPLETE_FIELDS = ('brand', 'model', 'generation')
+
+# Подсказки текущего процесса: (версия, CarAutocompleteIndex)
+_cached = (None, None)
+
+
+def _normalize(value):
+    return (value or '').strip().casefold()
+
+
+class PrefixTrie:
+    """
+    Префиксное дерево без учета регистра. В каждом узле сразу хранятся
+    лучшие limit значений для этого префикса, поэтому поиск - только
+    спуск по буквам запроса, без обхода поддерева.
+    """
+    __slots__ = ('root',)
+
+    def __init__(self, weights, limit=AUTOCOMPLETE_LIMIT):
+        """
+        weights - {значение: вес}. Значения с большим весом идут первыми,
+        при равном весе - по алфавиту.
+        """
+        # Узел - пара [дочерние узлы по букве, лучшие значения]
+        self.root = [{}, []]
+        for value in sorted(weights, key=lambda value: (-weights[value], value)):
+            node = self.root
+            if len(node[1]) < limit:
+                node[1].append(value)
+            for char in _normalize(value):
+                node = node[0].setdefault(char, [{}, []])
+                # Значения вставляются от лучших к худшим - первые limit и есть лучшие
+                if len(node[1]) < limit:
+                    node[1].append(value)
+
+    def search(self, prefix):
+        node = self.root
+        for char in _normalize(prefix):
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return list(node[1])
+
+
+class CarAutocompleteIndex:
+    """
+    Деревья подсказок: марки - общее дерево, модели - общее и для каждой
+    марки, поколения - общее, для каждой марки и для каждой пары марка/модель.
+    Вес значения - число машин с ним.
+    """
+
+    def __init__(self, groups):
+        # groups - строки (марка, модель, поколение, число машин)
+        brands = Counter()
+        models = defaultdict(Counter)
+        generations = defaultdict(Counter)
+        for brand, model, generation, cars_count in groups:
+            brand_key = _normalize(brand)
+            brands[brand] += cars_count
+            models[None][model] += cars_count
+            models[brand_key][model] += cars_count
+            if generation:
+                generations[None][generation] += cars_count
+                generations[brand_key][generation] += cars_count
+                generations[(brand_key, _normalize(model))][generation] += cars_count
+        self.brands = PrefixTrie(brands)
+        self.models = {key: PrefixTrie(weights) for key, weights in models.items()}
+        self.generations = {key: PrefixTrie(weights) for key, weights in generations.items()}
+
+    def suggest(self, field, query, brand=None, model=None):
+        """
+        Подсказки для поля field ('brand', 'model' или 'generation') по началу
+        строки query. Модели можно ограничить маркой, поколения - маркой и моделью.
+        """
+        if field == 'brand':
+            trie = self.brands
+        elif field == 'model':
+            trie = self.models.get(_normalize(brand) or None)
+        else:
+            if brand and model:
+                key = (_normalize(brand), _normalize(model))
+            else:
+                key = _normalize(brand) or None
+            trie = self.generations.get(key)
+        return trie.search(query) if trie is not None else []
+
+
+def invalidate_autocomplete():
+    # Подсказки во всех процессах перестроятся при следующем запросе
+    cache.set(AUTOCOMPLETE_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def get_autocomplete_index():
+    """
+    Подсказки текущего процесса. Из базы читаются, только если
+    версия в общем кэше изменилась с момента последней загрузки.
+    """
+    global _cached
+    from .models import CarStats
+
+    version = cache.get(AUTOCOMPLETE_VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(AUTOCOMPLETE_VERSION_CACHE_KEY, version, None):
+            version = cache.get(AUTOCOMPLETE_VERSION_CACHE_KEY)
+
+    cached_version, index = _cached
+    if cached_version != version or index is None:
+        index = CarAutocompleteIndex(
+            CarStats.objects.values_list('brand', 'model', 'generation', 'cars_count').order_by()
+        )
+        _cached = (version, index)
+    return index
@@ -0,0 +1,23 @@
+# Бэкенд аутентификации с кэшем пользователей
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from .user_cache import get_cached_user
+
+
+class CachedUserBackend(ModelBackend):
+    """
+    ModelBackend, который загружает пользователя сессии из кэша
+    (accounts.user_cache) - при попадании в кэш без запросов к базе.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None:
+            # Останавливаем перебор бэкендов: ModelBackend в AUTHENTICATION_BACKENDS
+            # оставлен только для старых сессий и не должен хэшировать пароль второй раз
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if self.user_can_authenticate(user) else None
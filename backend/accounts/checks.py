@@ -0,0 +1,21 @@
+# Системные проверки пользователей и машин
+from django.core.checks import Tags, Warning, register
+from tuning_studio.caches import LOCAL_CACHE_BACKENDS, get_cache_backend
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Снимки пользователей (accounts.user_cache), отзыв токенов и подсказки
+    марок сбрасываются во всех процессах через общий кэш. С кэшем в памяти
+    процесса другие процессы изменений не увидят.
+    """
+    backend = get_cache_backend()
+    if backend in LOCAL_CACHE_BACKENDS:
+        return [Warning(
+            f'Кэш по умолчанию ({backend}) не общий для процессов: изменения пользователей, '
+            'отзыв токенов и подсказки марок не дойдут до других процессов.',
+            hint='Укажите CACHE_BACKEND с файловым кэшем, Redis или Memcached.',
+            id='accounts.W001',
+        )]
+    return []
@@ -0,0 +1,313 @@
+# Фоновая обработка фото автомобилей
+#
+# Загруженное фото сохраняется как есть и помечается как "ожидает обработки".
+# Команда process_car_photos забирает такие записи из базы, обрезает фото
+# до 4:3, уменьшает и перекодирует в JPEG, а из результата делает миниатюру
+# для лент и галереи. Пока обработанная копия не готова, клиентам отдается
+# оригинал.
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз пытаться обработать фото, прежде чем пометить его как ошибочное
+MAX_PROCESSING_ATTEMPTS = 5
+# Сколько обработчик может держать фото, прежде чем его заберет другой обработчик
+PROCESSING_LEASE = timedelta(minutes=10)
+# Размер миниатюры фото машины (4:3, как и обработанное фото)
+CAR_THUMBNAIL_SIZE = (400, 300)
+
+
+class PhotoProcessingState(models.TextChoices):
+    PENDING = 'pending', 'Ожидает обработки'
+    PROCESSING = 'processing', 'Обрабатывается'
+    READY = 'ready', 'Обработано'
+    FAILED = 'failed', 'Ошибка обработки'
+
+
+class ProcessedPhotoModel(models.Model):
+    """
+    Абстрактная модель для моделей с полем photo, которое обрабатывается в фоне
+    """
+    photo_processed = models.ImageField(
+        upload_to='cars/processed/%Y/%m/%d/',
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Обработанное фото'
+    )
+    photo_thumbnail = models.ImageField(
+        upload_to='cars/thumbnails/%Y/%m/%d/',
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Миниатюра фото'
+    )
+    processing_state = models.CharField(
+        max_length=20,
+        choices=PhotoProcessingState.choices,
+        default=PhotoProcessingState.PENDING,
+        editable=False,
+        verbose_name='Состояние обработки фото'
+    )
+    processing_attempts = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Попыток обработки'
+    )
+    processing_error = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Ошибка обработки'
+    )
+    process_after = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Обработать после'
+    )
+
+    class Meta:
+        abstract = True
+
+    @property
+    def display_photo(self):
+        # Обработанная копия, если готова, иначе оригинал
+        if self.processing_state == PhotoProcessingState.READY and self.photo_processed:
+            return self.photo_processed
+        return self.photo
+
+    @property
+    def thumbnail_photo(self):
+        # Миниатюра, если готова (у фото, обработанных до появления миниатюр, ее нет),
+        # иначе display_photo
+        if self.processing_state == PhotoProcessingState.READY and self.photo_thumbnail:
+            return self.photo_thumbnail
+        return self.display_photo
+
+    def mark_photo_for_processing(self):
+        """
+        Вызывается из save() до сохранения: если загружен новый файл photo,
+        ставит его в очередь на обработку, а если фото нет - обрабатывать
+        нечего, запись сразу получает состояние ready.
+
+        Возвращает имена обработанной копии и миниатюры прежнего фото, которые
+        нужно удалить после сохранения (delete_replaced_processed_photo).
+        """
+        if self.photo and not self.photo._committed:
+            state = PhotoProcessingState.PENDING
+        elif not self.photo and (self.processing_state != PhotoProcessingState.READY or self.photo_processed):
+            state = PhotoProcessingState.READY
+        else:
+            return []
+        replaced = [file.name for file in (self.photo_processed, self.photo_thumbnail) if file]
+        self.photo_processed = None
+        self.photo_thumbnail = None
+        self.processing_state = state
+        self.processing_attempts = 0
+        self.processing_error = ''
+        self.process_after = None
+        return replaced
+
+    def delete_replaced_processed_photo(self, names):
+        """
+        Вызывается из save() после сохранения: удаляет обработанную копию
+        и миниатюру замененного фото после коммита (при откате файлы остаются)
+        """
+        if names:
+            storage = self.photo_processed.storage
+
+            def delete_files():
+                for name in names:
+                    storage.delete(name)
+            transaction.on_commit(delete_files)
+
+
+def process_car_image(source):
+    """
+    Обрабатывает изображение: обрезает до прямоугольного формата (не широкого)
+    Соотношение сторон 4:3, максимум 1200x900, результат - JPEG.
+    Возвращает ContentFile.
+    """
+    img = Image.open(source)
+    # Учитываем поворот из EXIF (фото с телефона)
+    img = ImageOps.exif_transpose(img)
+
+    # Конвертируем в RGB, если нужно
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    width, height = img.size
+
+    # Целевое соотношение сторон (4:3 - не широкий прямоугольник)
+    target_ratio = 4 / 3
+
+    # Определяем, как обрезать изображение
+    if width / height > target_ratio:
+        # Изображение слишком широкое - обрезаем по ширине (центрируем)
+        new_width = int(height * target_ratio)
+        left = (width - new_width) // 2
+        img = img.crop((left, 0, left + new_width, height))
+    else:
+        # Изображение слишком высокое - обрезаем по высоте (центрируем)
+        new_height = int(width / target_ratio)
+        top = (height - new_height) // 2
+        img = img.crop((0, top, width, top + new_height))
+
+    # Изменяем размер, если изображение слишком большое (максимум 1200x900)
+    img.thumbnail((1200, 900), Image.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=85, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def make_car_thumbnail(processed):
+    """
+    Миниатюра CAR_THUMBNAIL_SIZE из уже обработанного фото (ContentFile
+    или открытый файл JPEG 4:3). Возвращает ContentFile.
+    """
+    processed.seek(0)
+    img = Image.open(processed)
+    img.thumbnail(CAR_THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=80, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def save_processed_copies(instance, content):
+    """
+    Сохраняет в хранилище обработанное фото и миниатюру из него
+    (без записи в базу)
+    """
+    name = f'{os.path.splitext(os.path.basename(instance.photo.name))[0]}.jpg'
+    instance.photo_processed.save(name, content, save=False)
+    instance.photo_thumbnail.save(name, make_car_thumbnail(content), save=False)
+
+
+def claim_photos(model, limit):
+    """
+    Забирает из очереди до limit фото для обработки.
+
+    Строки блокируются с SKIP LOCKED, поэтому несколько обработчиков
+    не возьмут одно и то же фото. Взятое фото получает срок аренды:
+    если обработчик упадет, после PROCESSING_LEASE фото заберет другой.
+    Фото, на котором обработчик падал MAX_PROCESSING_ATTEMPTS раз,
+    помечается как ошибочное и больше не забирается.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        model.objects.filter(
+            processing_state=PhotoProcessingState.PROCESSING,
+            processing_attempts__gte=MAX_PROCESSING_ATTEMPTS,
+            process_after__lte=now,
+        ).update(
+            processing_state=PhotoProcessingState.FAILED,
+            processing_error='Истек срок обработки',
+            process_after=None,
+        )
+        photos = list(
+            model.objects.select_for_update(skip_locked=True).filter(
+                processing_state__in=[PhotoProcessingState.PENDING, PhotoProcessingState.PROCESSING],
+                processing_attempts__lt=MAX_PROCESSING_ATTEMPTS,
+            ).filter(
+                models.Q(process_after__isnull=True) | models.Q(process_after__lte=now)
+            ).exclude(photo='').exclude(photo__isnull=True).order_by('pk')[:limit]
+        )
+        model.objects.filter(pk__in=[photo.pk for photo in photos]).update(
+            processing_state=PhotoProcessingState.PROCESSING,
+            processing_attempts=models.F('processing_attempts') + 1,
+            process_after=now + PROCESSING_LEASE,
+        )
+    for photo in photos:
+        photo.processing_attempts += 1
+    return photos
+
+
+def process_photo(instance):
+    """
+    Обрабатывает одно взятое из очереди фото. При ошибке фото возвращается
+    в очередь с увеличивающейся задержкой, после MAX_PROCESSING_ATTEMPTS
+    попыток помечается как ошибочное. Возвращает True при успехе.
+    """
+    model = type(instance)
+    # Обновляем только если фото не заменили, пока шла обработка
+    current = model.objects.filter(pk=instance.pk, photo=instance.photo.name)
+    try:
+        with instance.photo.storage.open(instance.photo.name, 'rb') as source:
+            content = process_car_image(source)
+        save_processed_copies(instance, content)
+    except Exception as e:
+        logger.error(f'Ошибка обработки фото {model.__name__} #{instance.pk}: {e}')
+        if instance.processing_attempts >= MAX_PROCESSING_ATTEMPTS:
+            current.update(
+                processing_state=PhotoProcessingState.FAILED,
+                processing_error=str(e)[:255],
+                process_after=None,
+            )
+        else:
+            current.update(
+                processing_state=PhotoProcessingState.PENDING,
+                processing_error=str(e)[:255],
+                process_after=timezone.now() + timedelta(minutes=2 ** instance.processing_attempts),
+            )
+        return False
+
+    updated = current.update(
+        photo_processed=instance.photo_processed.name,
+        photo_thumbnail=instance.photo_thumbnail.name,
+        processing_state=PhotoProcessingState.READY,
+        processing_error='',
+        process_after=None,
+    )
+    if not updated:
+        # Фото заменили во время обработки - результат больше не нужен
+        instance.photo_processed.delete(save=False)
+        instance.photo_thumbnail.delete(save=False)
+    return bool(updated)
+
+
+def prepare_uploaded_photo(instance, upload):
+    """
+    Подготавливает новое (еще не сохраненное в базе) фото к bulk_create:
+    сохраняет оригинал в хранилище и сразу создает обработанную копию
+    и миниатюру.
+    Не обращается к базе, поэтому можно вызывать из нескольких потоков.
+
+    Если обработать фото не удалось, оно остается в очереди
+    (processing_state=pending) - его обработает process_car_photos.
+    """
+    instance.photo.save(upload.name, upload, save=False)
+    try:
+        upload.seek(0)
+        content = process_car_image(upload)
+    except Exception as e:
+        logger.error(f'Ошибка обработки загруженного фото {upload.name}: {e}')
+        instance.processing_state = PhotoProcessingState.PENDING
+        return instance
+    save_processed_copies(instance, content)
+    instance.processing_state = PhotoProcessingState.READY
+    return instance
+
+
+def delete_prepared_photos(instances):
+    """
+    Удаляет из хранилища файлы, записанные prepare_uploaded_photo,
+    если сохранить фото в базе не удалось
+    """
+    for instance in instances:
+        for file in (instance.photo, instance.photo_processed, instance.photo_thumbnail):
+            if file:
+                try:
+                    file.delete(save=False)
+                except Exception as e:
+                    logger.error(f'Не удалось удалить файл {file.name}: {e}')
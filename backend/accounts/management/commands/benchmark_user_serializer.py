@@ -0,0 +1,87 @@
+"""
+Management команда для замера скорости сериализации пользователей
+
+Создает N временных пользователей со случайными настройками приватности,
+несколько раз сериализует весь список через UserSerializer от лица
+постороннего пользователя и выводит время. Все созданные данные
+откатываются после замера.
+
+Использование:
+    python manage.py benchmark_user_serializer [--users N] [--rounds N]
+
+Примеры:
+    python manage.py benchmark_user_serializer
+    python manage.py benchmark_user_serializer --users 5000 --rounds 10
+"""
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from django.test import RequestFactory
+from accounts.models import User, Car
+from accounts.serializers import UserSerializer
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время сериализации списка пользователей через UserSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Количество пользователей в списке (по умолчанию: 1000)'
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=5,
+            help='Количество повторов замера (по умолчанию: 5)'
+        )
+
+    def handle(self, *args, **options):
+        count = options['users']
+        rounds = options['rounds']
+
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(
+                    username=f'benchmark_user_{i}',
+                    email=f'benchmark_user_{i}@example.com',
+                    first_name='Имя',
+                    last_name='Фамилия',
+                    phone='+70000000000',
+                    is_email_private=random.random() < 0.5,
+                    is_name_private=random.random() < 0.2,
+                    is_first_name_private=random.random() < 0.2,
+                    is_last_name_private=random.random() < 0.2,
+                    is_phone_private=random.random() < 0.5,
+                )
+                for i in range(count)
+            ])
+            users = list(
+                User.objects.filter(pk__in=[user.pk for user in users]).prefetch_related(
+                    Prefetch('cars', queryset=Car.objects.prefetch_related('photos'))
+                )
+            )
+
+            # Запрос от постороннего пользователя - приватные поля должны скрываться
+            request = RequestFactory().get('/api/accounts/users/')
+            request.user = User(pk=0, username='benchmark_viewer')
+
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                UserSerializer(users, many=True, context={'request': request}).data
+                timings.append(time.perf_counter() - started)
+
+            transaction.set_rollback(True)
+
+        best = min(timings)
+        self.stdout.write(f'Пользователей в списке: {count}, повторов: {rounds}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Лучшее время: {best * 1000:.1f} мс ({best / count * 1e6:.1f} мкс на пользователя)'
+        ))
+        self.stdout.write(f'Медиана: {statistics.median(timings) * 1000:.1f} мс')
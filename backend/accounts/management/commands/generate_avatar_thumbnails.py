@@ -0,0 +1,56 @@
+"""
+Management команда для создания миниатюр аватаров
+
+Создает миниатюры всех размеров (AVATAR_THUMBNAIL_SIZES) для пользователей,
+у которых есть аватар, но миниатюр еще нет. Нужна для аватаров, загруженных
+до появления миниатюр, и для повторной обработки после ошибок.
+
+Использование:
+    python manage.py generate_avatar_thumbnails [--batch-size N] [--force]
+
+Примеры:
+    python manage.py generate_avatar_thumbnails
+    python manage.py generate_avatar_thumbnails --force
+"""
+import time
+from django.core.management.base import BaseCommand
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры аватаров для пользователей, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько пользователей загружать за один запрос (по умолчанию: 500)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать миниатюры у всех пользователей с аватаром'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(avatar='').exclude(avatar__isnull=True)
+        if not options['force']:
+            users = users.filter(has_avatar_thumbnails=False)
+        users = users.only('id', 'avatar', 'has_avatar_thumbnails').order_by('pk')
+
+        started = time.monotonic()
+        created = 0
+        failed = 0
+        for user in users.iterator(chunk_size=options['batch_size']):
+            if user.create_avatar_thumbnails():
+                created += 1
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'Не удалось обработать аватар пользователя #{user.pk}'))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Созданы миниатюры для {created} пользователей'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Ошибок: {failed}'))
+        self.stdout.write(f'Время выполнения: {elapsed:.2f} с')
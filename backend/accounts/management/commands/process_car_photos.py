@@ -0,0 +1,131 @@
+"""
+Management команда - обработчик очереди фото автомобилей
+
+Забирает из базы фото машин (Car.photo) и фото из галереи (CarPhoto),
+ожидающие обработки, обрезает их до 4:3, уменьшает и сохраняет JPEG-копию
+и миниатюру. Неудачные попытки повторяются с увеличивающейся задержкой.
+
+С --thumbnails создает недостающие миниатюры для уже обработанных фото
+(обработанных до появления миниатюр) и завершается.
+
+Можно запускать несколько обработчиков одновременно - одно фото
+не будет взято дважды.
+
+Использование:
+    python manage.py process_car_photos [--once] [--thumbnails] [--batch-size N] [--workers N] [--interval N]
+
+Примеры:
+    python manage.py process_car_photos
+    python manage.py process_car_photos --once --workers 4
+    python manage.py process_car_photos --thumbnails
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from accounts.image_processing import PhotoProcessingState, claim_photos, make_car_thumbnail, process_photo
+from accounts.models import Car, CarPhoto
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает загруженные фото автомобилей в фоне'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать текущую очередь и завершиться'
+        )
+        parser.add_argument(
+            '--thumbnails',
+            action='store_true',
+            help='Создать недостающие миниатюры обработанных фото и завершиться'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Сколько фото брать из очереди за раз (по умолчанию: 20)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Сколько фото обрабатывать параллельно (по умолчанию: 2)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах, если очередь пуста (по умолчанию: 5)'
+        )
+
+    def handle(self, *args, **options):
+        if options['thumbnails']:
+            self._backfill_thumbnails(options['batch_size'])
+            return
+
+        processed = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                photos = []
+                for model in (Car, CarPhoto):
+                    photos.extend(claim_photos(model, options['batch_size']))
+
+                if photos:
+                    for ok in executor.map(self._process, photos):
+                        if ok:
+                            processed += 1
+                        else:
+                            failed += 1
+                    self.stdout.write(f'Обработано: {processed}, ошибок: {failed}')
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано фото: {processed}'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Ошибок (фото вернутся в очередь или помечены как ошибочные): {failed}'))
+
+    def _backfill_thumbnails(self, batch_size):
+        created = 0
+        for model in (Car, CarPhoto):
+            last_pk = 0
+            while True:
+                batch = list(
+                    model.objects.filter(
+                        Q(photo_thumbnail='') | Q(photo_thumbnail__isnull=True),
+                        pk__gt=last_pk,
+                        processing_state=PhotoProcessingState.READY,
+                    ).exclude(photo_processed='').exclude(photo_processed__isnull=True)
+                    .only('pk', 'photo', 'photo_processed', 'photo_thumbnail')
+                    .order_by('pk')[:batch_size]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                for instance in batch:
+                    with instance.photo_processed.open('rb') as processed:
+                        thumbnail = make_car_thumbnail(processed)
+                    name = instance.photo_processed.name.rsplit('/', 1)[-1]
+                    instance.photo_thumbnail.save(name, thumbnail, save=False)
+                    # Фото могли заменить, пока делали миниатюру
+                    updated = model.objects.filter(
+                        pk=instance.pk, photo_processed=instance.photo_processed.name
+                    ).update(photo_thumbnail=instance.photo_thumbnail.name)
+                    if updated:
+                        created += 1
+                    else:
+                        instance.photo_thumbnail.delete(save=False)
+        self.stdout.write(self.style.SUCCESS(f'Создано миниатюр: {created}'))
+
+    @staticmethod
+    def _process(photo):
+        # Каждый поток открывает свое подключение к базе - закрываем его после работы
+        try:
+            return process_photo(photo)
+        finally:
+            connection.close()
@@ -0,0 +1,66 @@
+"""
+Management команда для удаления просроченных сессий
+
+В отличие от стандартной clearsessions удаляет сессии пакетами,
+чтобы не держать долгую блокировку таблицы django_session одним
+большим DELETE. Копии сессий в кэше истекают сами.
+
+Использование:
+    python manage.py purge_expired_sessions [--batch-size N] [--sleep N] [--dry-run]
+
+Примеры:
+    python manage.py purge_expired_sessions
+    python manage.py purge_expired_sessions --batch-size 1000 --sleep 0.5
+"""
+import time
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные сессии из базы пакетами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько сессий удалять за один запрос (по умолчанию: 5000)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Пауза в секундах между пакетами (по умолчанию: 0.1)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать просроченные сессии, ничего не удаляя'
+        )
+
+    def handle(self, *args, **options):
+        # Граница фиксируется при запуске - сессии, истекшие во время работы, остаются до следующего раза
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+
+        if options['dry_run']:
+            self.stdout.write(f'Просроченных сессий: {expired.count()}')
+            return
+
+        started = time.monotonic()
+        deleted = 0
+        while True:
+            # Ключи пакета выбираются по индексу expire_date, удаление - по первичному ключу
+            keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if len(keys) < options['batch_size']:
+                break
+            time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Удалено просроченных сессий: {deleted}'))
+        self.stdout.write(f'Время выполнения: {elapsed:.2f} с')
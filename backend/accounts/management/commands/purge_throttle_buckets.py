@@ -0,0 +1,58 @@
+"""
+Management команда для удаления заполненных корзин ограничения частоты
+
+Корзина (ThrottleBucket), которая не использовалась дольше самого долгого
+периода из DEFAULT_THROTTLE_RATES, уже наполнилась заново - она равносильна
+отсутствующей, и ее можно удалить. Удаление идет пакетами.
+
+Использование:
+    python manage.py purge_throttle_buckets [--batch-size N] [--dry-run]
+
+Примеры:
+    python manage.py purge_throttle_buckets
+    python manage.py purge_throttle_buckets --batch-size 1000
+"""
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.settings import api_settings
+from accounts.models import ThrottleBucket
+from accounts.throttling import parse_rate
+
+
+class Command(BaseCommand):
+    help = 'Удаляет заполненные корзины ограничения частоты пакетами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько корзин удалять за один запрос (по умолчанию: 5000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать заполненные корзины, ничего не удаляя'
+        )
+
+    def handle(self, *args, **options):
+        periods = [parse_rate(rate)[1] for rate in api_settings.DEFAULT_THROTTLE_RATES.values() if rate]
+        if not periods:
+            self.stdout.write('Ограничения частоты не настроены')
+            return
+        full = ThrottleBucket.objects.filter(refilled_at__lt=time.time() - max(periods))
+
+        if options['dry_run']:
+            self.stdout.write(f'Заполненных корзин: {full.count()}')
+            return
+
+        deleted = 0
+        while True:
+            ids = list(full.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += ThrottleBucket.objects.filter(id__in=ids).delete()[0]
+            if len(ids) < options['batch_size']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'Удалено корзин: {deleted}'))
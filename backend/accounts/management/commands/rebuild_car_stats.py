@@ -0,0 +1,27 @@
+"""
+Management команда для пересчета статистики сообщества по машинам
+
+Статистика (CarStats) обновляется автоматически при сохранении и удалении
+машин и фото. Массовые изменения через QuerySet.update()/delete() и правки
+напрямую в базе сигналы не вызывают - после них статистику нужно пересчитать.
+
+Использование:
+    python manage.py rebuild_car_stats
+
+Примеры:
+    python manage.py rebuild_car_stats
+"""
+import time
+from django.core.management.base import BaseCommand
+from accounts.models import CarStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику по маркам, моделям и поколениям машин'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        groups = CarStats.rebuild()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Статистика пересчитана: {groups} групп'))
+        self.stdout.write(f'Время выполнения: {elapsed:.2f} с')
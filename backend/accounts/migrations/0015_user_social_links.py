@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_add_bio_and_social_networks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='instagram_url',
+            field=models.URLField(blank=True, editable=False, max_length=255, null=True, verbose_name='Ссылка Instagram'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='instagram_username',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, null=True, verbose_name='Username Instagram'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='telegram_url',
+            field=models.URLField(blank=True, editable=False, max_length=255, null=True, verbose_name='Ссылка Telegram'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='telegram_username',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, null=True, verbose_name='Username Telegram'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='vk_url',
+            field=models.URLField(blank=True, editable=False, max_length=255, null=True, verbose_name='Ссылка VK'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='vk_username',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, null=True, verbose_name='Username VK'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='youtube_url',
+            field=models.URLField(blank=True, editable=False, max_length=255, null=True, verbose_name='Ссылка YouTube'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='youtube_username',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, null=True, verbose_name='Username YouTube'),
+        ),
+    ]
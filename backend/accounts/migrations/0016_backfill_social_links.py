@@ -0,0 +1,47 @@
+# Generated manually
+# Миграция данных: заполняет username и ссылки на соцсети
+# у пользователей, созданных до появления этих полей
+
+from django.db import migrations
+from accounts.social_links import SOCIAL_NETWORKS, build_social_links
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_social_links(apps, schema_editor):
+    """
+    Вычисляет username и ссылки для всех пользователей, у которых указана
+    хотя бы одна соцсеть. Обновление идет пакетами через bulk_update.
+    """
+    User = apps.get_model('accounts', 'User')
+    derived_fields = [
+        field for network in SOCIAL_NETWORKS
+        for field in (f'{network}_username', f'{network}_url')
+    ]
+    users = User.objects.exclude(
+        instagram__isnull=True, telegram__isnull=True, youtube__isnull=True, vk__isnull=True
+    ).only('id', *SOCIAL_NETWORKS).order_by('pk')
+
+    batch = []
+    for user in users.iterator(chunk_size=BATCH_SIZE):
+        for network in SOCIAL_NETWORKS:
+            for field, value in build_social_links(network, getattr(user, network)).items():
+                setattr(user, field, value)
+        batch.append(user)
+        if len(batch) >= BATCH_SIZE:
+            User.objects.bulk_update(batch, derived_fields)
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, derived_fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_user_social_links'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_social_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_backfill_social_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='has_avatar_thumbnails',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры аватара созданы'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_user_has_avatar_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='photo_processed',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='cars/processed/%Y/%m/%d/', verbose_name='Обработанное фото'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='process_after',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Обработать после'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='processing_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Попыток обработки'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='processing_error',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Ошибка обработки'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='processing_state',
+            field=models.CharField(choices=[('pending', 'Ожидает обработки'), ('processing', 'Обрабатывается'), ('ready', 'Обработано'), ('failed', 'Ошибка обработки')], default='pending', editable=False, max_length=20, verbose_name='Состояние обработки фото'),
+        ),
+        migrations.AddField(
+            model_name='carphoto',
+            name='photo_processed',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='cars/processed/%Y/%m/%d/', verbose_name='Обработанное фото'),
+        ),
+        migrations.AddField(
+            model_name='carphoto',
+            name='process_after',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Обработать после'),
+        ),
+        migrations.AddField(
+            model_name='carphoto',
+            name='processing_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Попыток обработки'),
+        ),
+        migrations.AddField(
+            model_name='carphoto',
+            name='processing_error',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Ошибка обработки'),
+        ),
+        migrations.AddField(
+            model_name='carphoto',
+            name='processing_state',
+            field=models.CharField(choices=[('pending', 'Ожидает обработки'), ('processing', 'Обрабатывается'), ('ready', 'Обработано'), ('failed', 'Ошибка обработки')], default='pending', editable=False, max_length=20, verbose_name='Состояние обработки фото'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['processing_state', 'process_after'], name='car_processing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='carphoto',
+            index=models.Index(fields=['processing_state', 'process_after'], name='car_photo_processing_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_car_photo_processing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('brand', models.CharField(max_length=100, verbose_name='Марка')),
+                ('model', models.CharField(max_length=100, verbose_name='Модель')),
+                ('generation', models.CharField(blank=True, default='', max_length=100, verbose_name='Поколение/Кузов')),
+                ('cars_count', models.PositiveIntegerField(default=0, verbose_name='Машин')),
+                ('photos_count', models.PositiveIntegerField(default=0, verbose_name='Фото')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Статистика по моделям',
+                'verbose_name_plural': 'Статистика по моделям',
+                'ordering': ['-cars_count', 'brand', 'model', 'generation'],
+                'indexes': [models.Index(fields=['brand', 'model'], name='car_stats_prefix_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'])],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='carstats',
+            constraint=models.UniqueConstraint(fields=('brand', 'model', 'generation'), name='car_stats_unique_group'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated manually
+# Миграция данных: заполняет статистику сообщества по уже добавленным машинам
+
+from django.db import migrations
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_car_stats(apps, schema_editor):
+    """
+    Считает машины и фото по группам марка / модель / поколение
+    одним запросом с GROUP BY и сохраняет результат через bulk_create.
+    """
+    Car = apps.get_model('accounts', 'Car')
+    CarStats = apps.get_model('accounts', 'CarStats')
+    groups = Car.objects.annotate(
+        generation_key=Coalesce('generation', Value(''))
+    ).values('brand', 'model', 'generation_key').annotate(
+        cars=Count('id', distinct=True),
+        photos=Count('photos'),
+    ).order_by()
+    CarStats.objects.bulk_create([
+        CarStats(
+            brand=group['brand'],
+            model=group['model'],
+            generation=group['generation_key'],
+            cars_count=group['cars'],
+            photos_count=group['photos'],
+        )
+        for group in groups
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_car_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_car_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_backfill_car_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['-created_at', '-id'], name='car_gallery_idx'),
+        ),
+    ]
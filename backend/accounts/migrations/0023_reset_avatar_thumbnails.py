@@ -0,0 +1,22 @@
+# Generated manually
+# Миграция данных: миниатюры аватаров переименованы (me.png -> me.png_64.jpg
+# вместо me_64.jpg). Старые миниатюры больше не находятся - до запуска
+# generate_avatar_thumbnails отдается оригинал аватара
+
+from django.db import migrations
+
+
+def reset_avatar_thumbnails(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    User.objects.filter(has_avatar_thumbnails=True).update(has_avatar_thumbnails=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_user_token_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_avatar_thumbnails, migrations.RunPython.noop),
+    ]
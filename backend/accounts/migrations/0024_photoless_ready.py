@@ -0,0 +1,25 @@
+# Generated manually
+# Миграция данных: записи без фото обрабатывать нечего - раньше они
+# навсегда оставались в состоянии pending
+
+from django.db import migrations
+from django.db.models import Q
+
+
+def mark_photoless_ready(apps, schema_editor):
+    for model_name in ('Car', 'CarPhoto'):
+        model = apps.get_model('accounts', model_name)
+        model.objects.filter(Q(photo='') | Q(photo__isnull=True)).exclude(
+            processing_state='ready'
+        ).update(processing_state='ready', processing_attempts=0, processing_error='', process_after=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_reset_avatar_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_photoless_ready, migrations.RunPython.noop),
+    ]
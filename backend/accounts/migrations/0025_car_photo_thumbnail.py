@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_photoless_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='photo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='cars/thumbnails/%Y/%m/%d/', verbose_name='Миниатюра фото'),
+        ),
+        migrations.AddField(
+            model_name='carphoto',
+            name='photo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='cars/thumbnails/%Y/%m/%d/', verbose_name='Миниатюра фото'),
+        ),
+    ]
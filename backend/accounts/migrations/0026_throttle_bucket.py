@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_car_photo_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=150, unique=True, verbose_name='Ключ')),
+                ('tokens', models.FloatField(verbose_name='Токенов в корзине')),
+                ('refilled_at', models.FloatField(db_index=True, verbose_name='Время последнего пополнения')),
+            ],
+            options={
+                'verbose_name': 'Корзина ограничения частоты',
+                'verbose_name_plural': 'Корзины ограничения частоты',
+            },
+        ),
+    ]
@@ -1,10 +1,26 @@
 # Модели для пользователей и их машин
+import uuid
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from PIL import Image
-import os
-from django.core.files.base import ContentFile
-from io import BytesIO
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce, Greatest, Now
+from tuning_studio.dirty_fields import DirtyFieldsMixin
+from .autocomplete import invalidate_autocomplete
+from .tokens import publish_token_version
+from .image_processing import ProcessedPhotoModel
+from .social_links import SOCIAL_NETWORKS, build_social_links
+from .thumbnails import delete_avatar_thumbnails, generate_avatar_thumbnails
+from .user_cache import invalidate_cached_user
+
+
+# Биты маски приватности (User.privacy_mask)
+PRIVACY_EMAIL = 1
+PRIVACY_FIRST_NAME = 2
+PRIVACY_LAST_NAME = 4
+PRIVACY_PHONE = 8
+
+# Версия статистики сообщества в общем кэше - меняется при каждом изменении CarStats
+CAR_STATS_VERSION_CACHE_KEY = 'car_stats:version'
 
 
 # Пользователь с настройками приватности
@@ -21,6 +37,17 @@ class User(AbstractUser):
         null=True,
         verbose_name='Аватар'
     )
+    has_avatar_thumbnails = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Миниатюры аватара созданы'
+    )
+    # Версия токенов доступа (accounts/tokens.py): токены с меньшей версией отозваны
+    token_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Версия токенов'
+    )
     # Настройки приватности
     is_phone_private = models.BooleanField(
         default=False,
@@ -95,103 +122,162 @@ class User(AbstractUser):
         help_text='Ссылка или username VK'
     )
     
-    def get_instagram_url(self):
-        """Возвращает полную ссылку на Instagram"""
-        if not self.instagram:
-            return None
-        if self.instagram.startswith('http'):
-            return self.instagram
-        # Убираем @ если есть
-        username = self.instagram.lstrip('@')
-        return f'https://www.instagram.com/{username}/'
-    
-    def get_instagram_username(self):
-        """Возвращает username Instagram без @"""
-        if not self.instagram:
-            return None
-        # Если это ссылка, извлекаем username
-        if 'instagram.com' in self.instagram:
-            parts = self.instagram.rstrip('/').split('/')
-            username = parts[-1] if parts else None
-            return username.lstrip('@') if username else None
-        return self.instagram.lstrip('@')
-    
-    def get_telegram_url(self):
-        """Возвращает полную ссылку на Telegram"""
-        if not self.telegram:
-            return None
-        if self.telegram.startswith('http'):
-            return self.telegram
-        # Убираем @ если есть
-        username = self.telegram.lstrip('@')
-        return f'https://t.me/{username}'
+    # Username и полная ссылка вычисляются из полей выше при сохранении,
+    # чтобы не разбирать строки при каждой сериализации и искать по username
+    instagram_username = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Username Instagram'
+    )
+    instagram_url = models.URLField(
+        max_length=255,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Ссылка Instagram'
+    )
+    telegram_username = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Username Telegram'
+    )
+    telegram_url = models.URLField(
+        max_length=255,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Ссылка Telegram'
+    )
+    youtube_username = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Username YouTube'
+    )
+    youtube_url = models.URLField(
+        max_length=255,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Ссылка YouTube'
+    )
+    vk_username = models.CharField(
+        max_length=200,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Username VK'
+    )
+    vk_url = models.URLField(
+        max_length=255,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Ссылка VK'
+    )
     
-    def get_telegram_username(self):
-        """Возвращает username Telegram без @"""
-        if not self.telegram:
-            return None
-        # Если это ссылка, извлекаем username
-        if 't.me' in self.telegram or 'telegram.me' in self.telegram:
-            parts = self.telegram.rstrip('/').split('/')
-            username = parts[-1] if parts else None
-            return username.lstrip('@') if username else None
-        return self.telegram.lstrip('@')
+    @property
+    def privacy_mask(self):
+        """Настройки приватности одним числом - сумма битов PRIVACY_*"""
+        mask = 0
+        if self.is_email_private:
+            mask |= PRIVACY_EMAIL
+        if self.is_name_private or self.is_first_name_private:
+            mask |= PRIVACY_FIRST_NAME
+        if self.is_name_private or self.is_last_name_private:
+            mask |= PRIVACY_LAST_NAME
+        if self.is_phone_private:
+            mask |= PRIVACY_PHONE
+        return mask
     
-    def get_youtube_url(self):
-        """Возвращает полную ссылку на YouTube"""
-        if not self.youtube:
-            return None
-        if self.youtube.startswith('http'):
-            return self.youtube
-        # Может быть канал или пользователь
-        username = self.youtube.lstrip('@')
-        # Пробуем как канал
-        return f'https://www.youtube.com/@{username}'
+    def get_session_auth_hash(self):
+        """
+        Подпись сессии. У пользователя из кэша (accounts.user_cache) хэш
+        пароля не загружен - берем подпись, сохраненную вместе со снимком
+        """
+        cached_hash = getattr(self, 'cached_session_auth_hash', None)
+        if cached_hash is not None and 'password' in self.get_deferred_fields():
+            return cached_hash
+        return super().get_session_auth_hash()
     
-    def get_youtube_username(self):
-        """Возвращает username YouTube без @"""
-        if not self.youtube:
-            return None
-        # Если это ссылка, извлекаем username
-        if 'youtube.com' in self.youtube or 'youtu.be' in self.youtube:
-            # Может быть /channel/, /user/, /c/, /@
-            if '/@' in self.youtube:
-                parts = self.youtube.split('/@')
-                username = parts[-1].split('/')[0] if parts else None
-                return username if username else None
-            elif '/channel/' in self.youtube or '/user/' in self.youtube or '/c/' in self.youtube:
-                parts = self.youtube.rstrip('/').split('/')
-                username = parts[-1] if parts else None
-                return username if username else None
-            return None
-        return self.youtube.lstrip('@')
+    def update_social_links(self):
+        """Пересчитывает username и ссылки на соцсети из введенных значений"""
+        # У пользователя из кэша (accounts.user_cache) соцсети не загружены -
+        # не читаем их из базы ради пересчета
+        deferred = self.get_deferred_fields()
+        for network in SOCIAL_NETWORKS:
+            if network in deferred:
+                continue
+            for field, value in build_social_links(network, getattr(self, network)).items():
+                setattr(self, field, value)
     
-    def get_vk_url(self):
-        """Возвращает полную ссылку на VK"""
-        if not self.vk:
-            return None
-        if self.vk.startswith('http'):
-            return self.vk
-        # Убираем @ если есть
-        username = self.vk.lstrip('@')
-        # Может быть id или username
-        if username.isdigit():
-            return f'https://vk.com/id{username}'
-        return f'https://vk.com/{username}'
+    def save(self, *args, **kwargs):
+        self.update_social_links()
+        # Новый файл аватара еще не записан в хранилище
+        avatar_uploaded = bool(self.avatar) and not self.avatar._committed
+        # Миниатюры старого аватара удаляются после замены или удаления аватара.
+        # Имя старого файла читается из базы, только если миниатюры у него были
+        old_avatar = None
+        if (avatar_uploaded or not self.avatar) and self.has_avatar_thumbnails and not self._state.adding:
+            old_avatar = User.objects.filter(pk=self.pk).values_list('avatar', flat=True).first()
+        if avatar_uploaded or not self.avatar:
+            self.has_avatar_thumbnails = False
+        # set_password() запоминает новый пароль до сохранения - отзываем выданные токены
+        password_changed = self._password is not None and not self._state.adding
+        if password_changed:
+            self.token_version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # Если сохраняется поле соцсети, сохраняем и вычисленные из него поля
+            update_fields = set(update_fields)
+            for network in SOCIAL_NETWORKS:
+                if network in update_fields:
+                    update_fields.update([f'{network}_username', f'{network}_url'])
+            if 'avatar' in update_fields:
+                update_fields.add('has_avatar_thumbnails')
+            if password_changed:
+                update_fields.add('token_version')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        if password_changed:
+            user_id, token_version = self.pk, self.token_version
+            transaction.on_commit(lambda: publish_token_version(user_id, token_version))
+        if old_avatar and old_avatar != self.avatar.name:
+            storage = self.avatar.storage
+            transaction.on_commit(lambda: delete_avatar_thumbnails(storage, old_avatar))
+        if avatar_uploaded:
+            # Миниатюры создаются после коммита: при откате транзакции
+            # файлы миниатюр не останутся в хранилище без записи
+            transaction.on_commit(self.create_avatar_thumbnails)
     
-    def get_vk_username(self):
-        """Возвращает username VK без @"""
-        if not self.vk:
-            return None
-        # Если это ссылка, извлекаем username
-        if 'vk.com' in self.vk:
-            parts = self.vk.rstrip('/').split('/')
-            username = parts[-1] if parts else None
-            # Убираем id если есть
-            if username and username.startswith('id'):
-                return username
-            return username if username else None
-        return self.vk.lstrip('@')
+    def create_avatar_thumbnails(self):
+        """
+        Создает миниатюры аватара. Если файл не удалось обработать,
+        остается оригинал, а миниатюры можно будет создать командой
+        generate_avatar_thumbnails.
+        """
+        try:
+            generate_avatar_thumbnails(self.avatar)
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f'Ошибка создания миниатюр аватара пользователя {self.pk}: {e}')
+            return False
+        # Отмечаем, только если аватар не успели заменить, пока создавались миниатюры
+        User.objects.filter(pk=self.pk, avatar=self.avatar.name).update(has_avatar_thumbnails=True)
+        # update() не вызывает сигналы - снимок пользователя сбрасываем сами
+        invalidate_cached_user(self.pk)
+        self.has_avatar_thumbnails = True
+        return True
     
     class Meta:
         verbose_name = 'Пользователь'
@@ -277,7 +363,7 @@ class UserBadge(models.Model):
         return f"{self.user.username} - {self.badge.name}"
 
 
-class Car(models.Model):
+class Car(DirtyFieldsMixin, ProcessedPhotoModel):
     """
     Модель автомобиля клиента.
     
@@ -344,13 +430,16 @@ class Car(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', '-created_at'], name='car_user_created_idx'),
+            # Общая галерея: ORDER BY created_at DESC, id DESC и пагинация по ключу
+            models.Index(fields=['-created_at', '-id'], name='car_gallery_idx'),
+            models.Index(fields=['processing_state', 'process_after'], name='car_processing_idx'),
         ]
     
     def save(self, *args, **kwargs):
         """
         Переопределяем метод save для:
         1. Автоматического преобразования регистра для generation (jzx -> JZX)
-        2. Обработки и обрезки изображения до прямоугольного формата
+        2. Постановки нового фото в очередь на обработку (обрезка до 4:3)
         """
         # Автоматическое преобразование регистра для generation
         if self.generation:
@@ -372,117 +461,11 @@ class Car(models.Model):
         if self.vin:
             self.vin = self.vin.strip().upper()
         
-        # Обрабатываем изображение, если оно было загружено
-        # Проверяем, является ли это новым файлом
-        if self.photo:
-            photo_changed = False
-            if not self.pk:
-                # Новый объект - всегда обрабатываем
-                photo_changed = True
-            else:
-                # Существующий объект - проверяем, изменилось ли фото
-                try:
-                    old_car = Car.objects.get(pk=self.pk)
-                    if not old_car.photo or (hasattr(self.photo, 'name') and self.photo.name != old_car.photo.name):
-                        photo_changed = True
-                except Car.DoesNotExist:
-                    photo_changed = True
-            
-            if photo_changed:
-                try:
-                    # Временно отключаем обработку изображения для отладки
-                    # Раскомментируйте следующую строку, чтобы включить обработку:
-                    # self.photo = self._process_image(self.photo)
-                    pass  # Пока сохраняем изображение без обработки
-                except Exception as e:
-                    # Если обработка изображения не удалась, сохраняем без обработки
-                    import logging
-                    import traceback
-                    logger = logging.getLogger(__name__)
-                    logger.error(f'Ошибка обработки изображения: {e}')
-                    logger.error(traceback.format_exc())
-                    # Продолжаем сохранение без обработки изображения
-                    # Изображение будет сохранено как есть
+        # Новое фото обрабатывается в фоне (команда process_car_photos)
+        replaced_processed = self.mark_photo_for_processing()
         
         super().save(*args, **kwargs)
-    
-    def _process_image(self, image):
-        """
-        Обрабатывает изображение: обрезает до прямоугольного формата (не широкого)
-        Соотношение сторон 4:3 - вертикальный прямоугольник
-        """
-        # Открываем изображение
-        # Для Django InMemoryUploadedFile или TemporaryUploadedFile
-        if hasattr(image, 'file'):
-            # Сохраняем текущую позицию
-            if hasattr(image.file, 'seek'):
-                current_pos = image.file.tell()
-                image.file.seek(0)
-            img = Image.open(image.file)
-            # Возвращаемся в начало файла
-            if hasattr(image.file, 'seek'):
-                image.file.seek(0)
-        elif hasattr(image, 'read'):
-            # Обычный файловый объект
-            current_pos = image.tell()
-            image.seek(0)
-            img = Image.open(image)
-            image.seek(current_pos)
-        else:
-            # Путь к файлу или другой формат
-            img = Image.open(image)
-        
-        # Конвертируем в RGB, если нужно
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        width, height = img.size
-        
-        # Целевое соотношение сторон (4:3 - не широкий прямоугольник)
-        target_ratio = 4 / 3
-        
-        # Определяем, как обрезать изображение
-        if width / height > target_ratio:
-            # Изображение слишком широкое - обрезаем по ширине (центрируем)
-            new_width = int(height * target_ratio)
-            left = (width - new_width) // 2
-            img = img.crop((left, 0, left + new_width, height))
-        else:
-            # Изображение слишком высокое - обрезаем по высоте (центрируем)
-            new_height = int(width / target_ratio)
-            top = (height - new_height) // 2
-            img = img.crop((0, top, width, top + new_height))
-        
-        # Изменяем размер, если изображение слишком большое (максимум 1200x900)
-        max_width = 1200
-        max_height = 900
-        if img.width > max_width or img.height > max_height:
-            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-        
-        # Сохраняем обработанное изображение в буфер
-        buffer = BytesIO()
-        img.save(buffer, format='JPEG', quality=85, optimize=True)
-        buffer.seek(0)
-        
-        # Создаем новое имя файла
-        filename = os.path.basename(image.name) if hasattr(image, 'name') and image.name else 'car_photo.jpg'
-        name, ext = os.path.splitext(filename)
-        new_filename = f"{name}_processed.jpg"
-        
-        # Создаем новый файл с обработанным изображением
-        image_file = ContentFile(buffer.read(), name=new_filename)
-        buffer.close()
-        
-        # Заменяем содержимое исходного файла
-        # Для Django InMemoryUploadedFile или TemporaryUploadedFile
-        if hasattr(image, 'file'):
-            image.file = image_file
-            image.name = new_filename
-        else:
-            # Создаем новый объект файла
-            image = image_file
-        
-        return image
+        self.delete_replaced_processed_photo(replaced_processed)
     
     def __str__(self):
         # Возвращает название машины для отображения
@@ -492,7 +475,7 @@ class Car(models.Model):
         return f"{self.brand} {self.model} ({plate})"
 
 
-class CarPhoto(models.Model):
+class CarPhoto(DirtyFieldsMixin, ProcessedPhotoModel):
     """
     Модель для хранения множественных фото автомобиля.
     
@@ -524,6 +507,7 @@ class CarPhoto(models.Model):
         ordering = ['-is_primary', '-created_at']
         indexes = [
             models.Index(fields=['car', '-is_primary', '-created_at'], name='car_photo_idx'),
+            models.Index(fields=['processing_state', 'process_after'], name='car_photo_processing_idx'),
         ]
     
     def __str__(self):
@@ -533,10 +517,195 @@ class CarPhoto(models.Model):
         """
         При сохранении фото как основного, снимаем флаг is_primary с других фото этого автомобиля.
         """
-        if self.is_primary and self.pk:
-            # Если это новое фото или существующее, но мы делаем его основным
-            CarPhoto.objects.filter(car=self.car, is_primary=True).exclude(pk=self.pk).update(is_primary=False)
-        elif self.is_primary:
-            # Если это новое фото и оно основное
-            CarPhoto.objects.filter(car=self.car, is_primary=True).update(is_primary=False)
+        # Другие фото трогаем, только если фото стало основным (флаг изменился)
+        if self.is_primary and self.is_dirty('is_primary'):
+            other_primary = CarPhoto.objects.filter(car_id=self.car_id, is_primary=True)
+            if self.pk:
+                other_primary = other_primary.exclude(pk=self.pk)
+            other_primary.update(is_primary=False)
+        # Новое фото обрабатывается в фоне (команда process_car_photos)
+        replaced_processed = self.mark_photo_for_processing()
         super().save(*args, **kwargs)
+        self.delete_replaced_processed_photo(replaced_processed)
+
+
+class CarStats(models.Model):
+    """
+    Статистика сообщества: сколько машин и фото у каждой связки
+    марка / модель / поколение.
+
+    Обновляется понемногу обработчиками сигналов Car и CarPhoto
+    (accounts/signals.py). Массовые update()/delete() сигналы не вызывают -
+    после них статистику пересчитывает команда rebuild_car_stats.
+    """
+    brand = models.CharField(
+        max_length=100,
+        verbose_name='Марка'
+    )
+    model = models.CharField(
+        max_length=100,
+        verbose_name='Модель'
+    )
+    generation = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='Поколение/Кузов'
+    )
+    cars_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Машин'
+    )
+    photos_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Фото'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика по моделям'
+        verbose_name_plural = 'Статистика по моделям'
+        ordering = ['-cars_count', 'brand', 'model', 'generation']
+        constraints = [
+            models.UniqueConstraint(fields=['brand', 'model', 'generation'], name='car_stats_unique_group'),
+        ]
+        indexes = [
+            # Поиск по началу марки и модели: WHERE brand LIKE 'Toy%'
+            models.Index(
+                fields=['brand', 'model'],
+                name='car_stats_prefix_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']
+            ),
+        ]
+
+    def __str__(self):
+        name = f"{self.brand} {self.model} {self.generation}".strip()
+        return f"{name}: {self.cars_count}"
+
+    @staticmethod
+    def group_key(brand, model, generation):
+        # Ключ группы: у Car поколение может быть NULL, в статистике - пустая строка
+        return {'brand': brand, 'model': model, 'generation': generation or ''}
+
+    @classmethod
+    def apply_delta(cls, key, cars=0, photos=0):
+        """
+        Прибавить к счетчикам группы key (см. group_key) cars машин и photos фото.
+        Отрицательные значения уменьшают счетчики, пустые группы удаляются.
+        """
+        if not cars and not photos:
+            return
+        updated = cls.objects.filter(**key).update(
+            cars_count=Greatest(models.F('cars_count') + cars, 0),
+            photos_count=Greatest(models.F('photos_count') + photos, 0),
+            updated_at=Now(),
+        )
+        if not updated and cars > 0:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(**key, cars_count=cars, photos_count=max(photos, 0))
+            except IntegrityError:
+                # Группу только что создал параллельный запрос
+                cls.apply_delta(key, cars, photos)
+            else:
+                # Новая группа - новые подсказки марки, модели или поколения
+                transaction.on_commit(invalidate_autocomplete)
+        if cars < 0:
+            deleted, _ = cls.objects.filter(**key, cars_count=0).delete()
+            if deleted:
+                transaction.on_commit(invalidate_autocomplete)
+
+    @classmethod
+    def apply_photos_delta(cls, car_id, photos):
+        """
+        Изменить число фото группы машины car_id одним запросом,
+        не загружая саму машину
+        """
+        car = Car.objects.annotate(
+            generation_key=Coalesce('generation', models.Value(''))
+        ).filter(
+            pk=car_id,
+            brand=models.OuterRef('brand'),
+            model=models.OuterRef('model'),
+            generation_key=models.OuterRef('generation'),
+        )
+        cls.objects.filter(models.Exists(car)).update(
+            photos_count=Greatest(models.F('photos_count') + photos, 0),
+            updated_at=Now(),
+        )
+
+    @staticmethod
+    def invalidate_cache():
+        # Закэшированные страницы статистики привязаны к версии - меняем ее
+        cache.set(CAR_STATS_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+    @staticmethod
+    def cache_version():
+        version = cache.get(CAR_STATS_VERSION_CACHE_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(CAR_STATS_VERSION_CACHE_KEY, version, None):
+                version = cache.get(CAR_STATS_VERSION_CACHE_KEY)
+        return version
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Полностью пересчитать статистику по таблицам Car и CarPhoto.
+        Возвращает количество групп.
+        """
+        groups = Car.objects.annotate(
+            generation_key=Coalesce('generation', models.Value(''))
+        ).values('brand', 'model', 'generation_key').annotate(
+            cars=models.Count('id', distinct=True),
+            photos=models.Count('photos'),
+        ).order_by()
+        stats = [
+            cls(
+                **cls.group_key(group['brand'], group['model'], group['generation_key']),
+                cars_count=group['cars'],
+                photos_count=group['photos'],
+            )
+            for group in groups
+        ]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(stats, batch_size=1000)
+            transaction.on_commit(cls.invalidate_cache)
+            transaction.on_commit(invalidate_autocomplete)
+        return len(stats)
+
+
+class ThrottleBucket(models.Model):
+    """
+    Корзина токенов ограничения частоты (accounts/throttling.py) для одного
+    ключа: IP-адреса или username в рамках scope.
+
+    Хранится в базе, а не в кэше: взятие токена - один условный UPDATE
+    с F(), он атомарен для всех процессов при любом бэкенде кэша.
+    Полная корзина равносильна отсутствующей - старые записи удаляет
+    команда purge_throttle_buckets.
+    """
+    key = models.CharField(
+        max_length=150,
+        unique=True,
+        verbose_name='Ключ'
+    )
+    tokens = models.FloatField(
+        verbose_name='Токенов в корзине'
+    )
+    # Unix-время в секундах: пополнение считается арифметикой в UPDATE
+    refilled_at = models.FloatField(
+        db_index=True,
+        verbose_name='Время последнего пополнения'
+    )
+
+    class Meta:
+        verbose_name = 'Корзина ограничения частоты'
+        verbose_name_plural = 'Корзины ограничения частоты'
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.2f}"
@@ -1,6 +1,27 @@
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
 from django.contrib.auth import authenticate
-from .models import User, Car, CarPhoto
+from .author_cards import AuthorCardField
+from .thumbnails import get_avatar_url, get_avatar_urls
+from .models import (
+    User, Car, CarPhoto, CarStats, PRIVACY_EMAIL, PRIVACY_FIRST_NAME, PRIVACY_LAST_NAME, PRIVACY_PHONE
+)
+
+
+# Какие поля скрывает каждый бит маски приватности
+PRIVACY_FIELDS = {
+    PRIVACY_EMAIL: 'email',
+    PRIVACY_FIRST_NAME: 'first_name',
+    PRIVACY_LAST_NAME: 'last_name',
+    PRIVACY_PHONE: 'phone',
+}
+# Набор скрытых полей для каждой возможной маски - вычисляется один раз при импорте
+PRIVACY_HIDDEN_FIELDS = [
+    frozenset(field for bit, field in PRIVACY_FIELDS.items() if mask & bit)
+    for mask in range(sum(PRIVACY_FIELDS) + 1)
+]
+VIEWER_ID_CONTEXT_KEY = 'viewer_id'
 
 
 # Сериализатор для фото машины
@@ -9,17 +30,92 @@ class CarPhotoSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = CarPhoto
-        fields = ['id', 'photo', 'photo_url', 'is_primary', 'created_at']
-        read_only_fields = ['id', 'created_at', 'photo_url']
+        fields = ['id', 'photo', 'photo_url', 'is_primary', 'processing_state', 'created_at']
+        read_only_fields = ['id', 'created_at', 'photo_url', 'processing_state']
     
     def get_photo_url(self, obj):
-        # Возвращает полную ссылку на фото
-        if obj.photo:
+        # Возвращает полную ссылку на фото (оригинал, пока обработанное фото не готово)
+        photo = obj.display_photo
+        if photo:
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(obj.photo.url)
-            return obj.photo.url
+                return request.build_absolute_uri(photo.url)
+            return photo.url
+        return None
+
+
+# Сколько фото можно загрузить за один запрос
+MAX_BULK_UPLOAD_PHOTOS = 20
+
+
+class CarPhotoBulkUploadSerializer(serializers.Serializer):
+    """
+    Загрузка нескольких фото автомобиля одним multipart-запросом:
+    car, photos (несколько файлов), primary_index - номер фото (с 0),
+    которое станет основным
+    """
+    car = serializers.IntegerField(label='Автомобиль')
+    photos = serializers.ListField(
+        child=serializers.ImageField(),
+        allow_empty=False,
+        max_length=MAX_BULK_UPLOAD_PHOTOS,
+        label='Фото'
+    )
+    primary_index = serializers.IntegerField(required=False, min_value=0, label='Основное фото')
+
+    def validate(self, data):
+        primary_index = data.get('primary_index')
+        if primary_index is not None and primary_index >= len(data['photos']):
+            raise serializers.ValidationError({'primary_index': 'Нет фото с таким номером'})
+        return data
+
+
+def get_car_primary_photo_url(car, request=None, thumbnail=False):
+    """
+    Ссылка на основное фото машины, а если его нет - на старое поле photo.
+    С thumbnail=True - на миниатюру фото (thumbnail_photo).
+    Если фото загружены через prefetch_related('photos') или основные фото -
+    через Prefetch(..., to_attr='primary_photos'), запрос к базе не выполняется.
+    Найденное фото запоминается на объекте, чтобы photo_url и primary_photo_url
+    не искали его дважды.
+    """
+    if not hasattr(car, 'primary_photos'):
+        prefetched = getattr(car, '_prefetched_objects_cache', {})
+        if 'photos' in prefetched:
+            car.primary_photos = [photo for photo in prefetched['photos'] if photo.is_primary][:1]
+        else:
+            car.primary_photos = list(car.photos.filter(is_primary=True)[:1])
+    primary_photo = car.primary_photos[0] if car.primary_photos else None
+    # Пока обработанное фото не готово, display_photo - оригинал
+    source = primary_photo if primary_photo and primary_photo.photo else car
+    photo = source.thumbnail_photo if thumbnail else source.display_photo
+    if not photo:
         return None
+    if request:
+        return request.build_absolute_uri(photo.url)
+    return photo.url
+
+
+# Машина в общей галерее - без госномера и VIN, с карточкой владельца
+class GalleryCarSerializer(serializers.ModelSerializer):
+    # Миниатюра основного фото (до 400x300), полный размер - в карточке машины
+    thumbnail_url = serializers.SerializerMethodField()
+    owner = AuthorCardField(source='user_id')
+    
+    class Meta:
+        model = Car
+        fields = ['id', 'brand', 'model', 'generation', 'year', 'color', 'thumbnail_url', 'owner', 'created_at']
+        read_only_fields = fields
+    
+    def get_thumbnail_url(self, obj):
+        return get_car_primary_photo_url(obj, self.context.get('request'), thumbnail=True)
+
+
+# Статистика сообщества по марке, модели и поколению
+class CarStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CarStats
+        fields = ['brand', 'model', 'generation', 'cars_count', 'photos_count']
 
 
 # Сериализатор для машины
@@ -30,62 +126,47 @@ class CarSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Car
-        fields = ['id', 'brand', 'model', 'generation', 'year', 'license_plate', 'vin', 'color', 'photo', 'photo_url', 'primary_photo_url', 'photos', 'created_at']
-        read_only_fields = ['id', 'created_at', 'photo_url', 'primary_photo_url', 'photos']
+        fields = ['id', 'brand', 'model', 'generation', 'year', 'license_plate', 'vin', 'color', 'photo', 'photo_url', 'primary_photo_url', 'photos', 'processing_state', 'created_at']
+        read_only_fields = ['id', 'created_at', 'photo_url', 'primary_photo_url', 'photos', 'processing_state']
     
     def get_photo_url(self, obj):
         # Возвращает ссылку на основное фото - для обратной совместимости
-        # Сначала ищем основное фото из CarPhoto
-        primary_photo = obj.photos.filter(is_primary=True).first()
-        if primary_photo and primary_photo.photo:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(primary_photo.photo.url)
-            return primary_photo.photo.url
-        
-        # Если нет основного фото, используем старое поле photo
-        if obj.photo:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.photo.url)
-            return obj.photo.url
-        return None
+        return get_car_primary_photo_url(obj, self.context.get('request'))
     
     def get_primary_photo_url(self, obj):
         # Возвращает ссылку на основное фото
-        primary_photo = obj.photos.filter(is_primary=True).first()
-        if primary_photo and primary_photo.photo:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(primary_photo.photo.url)
-            return primary_photo.photo.url
-        
-        # Если нет основного фото, используем старое поле photo
-        if obj.photo:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.photo.url)
-            return obj.photo.url
-        return None
+        return get_car_primary_photo_url(obj, self.context.get('request'))
+
+
+# Краткая карточка машины для публичного профиля - без списка всех фото
+class CarSummarySerializer(serializers.ModelSerializer):
+    photo_url = serializers.SerializerMethodField()
+    primary_photo_url = serializers.SerializerMethodField()
+    photos_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Car
+        fields = ['id', 'brand', 'model', 'generation', 'year', 'license_plate', 'vin', 'color',
+                  'photo_url', 'primary_photo_url', 'photos_count']
+        read_only_fields = fields
+    
+    def get_photo_url(self, obj):
+        return get_car_primary_photo_url(obj, self.context.get('request'))
+    
+    def get_primary_photo_url(self, obj):
+        return get_car_primary_photo_url(obj, self.context.get('request'))
 
 
 class UserSerializer(serializers.ModelSerializer):
     cars = CarSerializer(many=True, read_only=True)
     avatar_url = serializers.SerializerMethodField()
-    instagram_url = serializers.SerializerMethodField()
-    instagram_username = serializers.SerializerMethodField()
-    telegram_url = serializers.SerializerMethodField()
-    telegram_username = serializers.SerializerMethodField()
-    youtube_url = serializers.SerializerMethodField()
-    youtube_username = serializers.SerializerMethodField()
-    vk_url = serializers.SerializerMethodField()
-    vk_username = serializers.SerializerMethodField()
+    avatar_thumbnails = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'phone', 'avatar', 'avatar_url', 'is_phone_private', 
+            'phone', 'avatar', 'avatar_url', 'avatar_thumbnails', 'is_phone_private', 
             'is_name_private', 'is_first_name_private', 'is_last_name_private',
             'is_email_private', 'is_staff', 'is_superuser',
             'bio', 'instagram', 'telegram', 'youtube', 'vk',
@@ -95,7 +176,7 @@ class UserSerializer(serializers.ModelSerializer):
             'vk_url', 'vk_username',
             'cars', 'created_at'
         ]
-        read_only_fields = ['id', 'created_at', 'avatar_url', 'is_staff', 'is_superuser',
+        read_only_fields = ['id', 'created_at', 'avatar_url', 'avatar_thumbnails', 'is_staff', 'is_superuser',
                            'instagram_url', 'instagram_username',
                            'telegram_url', 'telegram_username',
                            'youtube_url', 'youtube_username',
@@ -103,94 +184,59 @@ class UserSerializer(serializers.ModelSerializer):
     
     def get_avatar_url(self, obj):
         # Возвращает полную ссылку на аватар
-        if obj.avatar:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.avatar.url)
-            return obj.avatar.url
-        return None
-    
-    def get_instagram_url(self, obj):
-        return obj.get_instagram_url()
+        return get_avatar_url(obj, request=self.context.get('request'))
     
-    def get_instagram_username(self, obj):
-        return obj.get_instagram_username()
+    def get_avatar_thumbnails(self, obj):
+        # Ссылки на миниатюры аватара по размерам - клиент выбирает наименьшую подходящую
+        return get_avatar_urls(obj, self.context.get('request'))
     
-    def get_telegram_url(self, obj):
-        return obj.get_telegram_url()
-    
-    def get_telegram_username(self, obj):
-        return obj.get_telegram_username()
-    
-    def get_youtube_url(self, obj):
-        return obj.get_youtube_url()
-    
-    def get_youtube_username(self, obj):
-        return obj.get_youtube_username()
-    
-    def get_vk_url(self, obj):
-        return obj.get_vk_url()
-    
-    def get_vk_username(self, obj):
-        return obj.get_vk_username()
-    
-    def _is_own_profile(self, obj):
-        # Проверяет, является ли текущий пользователь владельцем профиля
-        request = self.context.get('request')
-        if not request:
-            # Если нет запроса в контексте, считаем что это не свой профиль
-            return False
-        if not hasattr(request, 'user') or not request.user.is_authenticated:
-            return False
-        return request.user.id == obj.id
+    def _get_viewer_id(self):
+        """
+        id текущего пользователя - определяется один раз на весь ответ
+        и хранится в контексте (None для анонимов и вызовов без запроса)
+        """
+        if VIEWER_ID_CONTEXT_KEY not in self.context:
+            request = self.context.get('request')
+            user = getattr(request, 'user', None)
+            self.context[VIEWER_ID_CONTEXT_KEY] = user.id if user is not None and user.is_authenticated else None
+        return self.context[VIEWER_ID_CONTEXT_KEY]
     
     def to_representation(self, instance):
-        # Переопределяем метод для скрытия данных по настройкам приватности
-        data = super().to_representation(instance)
-        
-        # Проверяем, является ли это запросом собственного профиля
-        is_own = self._is_own_profile(instance)
-        
-        # Если нет запроса в контексте, скрываем приватные данные по умолчанию
-        request = self.context.get('request')
-        if not request:
-            # Без запроса не можем определить владельца, скрываем приватные данные
-            if instance.is_email_private:
-                data['email'] = None
-            if instance.is_name_private:
-                data['first_name'] = None
-                data['last_name'] = None
-            elif instance.is_first_name_private:
-                data['first_name'] = None
-            elif instance.is_last_name_private:
-                data['last_name'] = None
-            if instance.is_phone_private:
-                data['phone'] = None
-            return data
-        
-        # Скрываем email, если включена приватность и это не свой профиль
-        if instance.is_email_private and not is_own:
-            data['email'] = None
-        
-        # Скрываем имя и фамилию по настройкам приватности
-        if instance.is_name_private and not is_own:
-            # Если включено общее скрытие имени и фамилии, скрываем оба
-            data['first_name'] = None
-            data['last_name'] = None
+        # Скрытые по настройкам приватности поля не сериализуются вовсе, а сразу равны None.
+        # Свой профиль пользователь видит полностью
+        if instance.pk is not None and instance.pk == self._get_viewer_id():
+            hidden = frozenset()
         else:
-            # Иначе скрываем отдельно имя или фамилию
-            if instance.is_first_name_private and not is_own:
-                data['first_name'] = None
-            if instance.is_last_name_private and not is_own:
-                data['last_name'] = None
-        
-        # Скрываем телефон, если включена приватность и это не свой профиль
-        if instance.is_phone_private and not is_own:
-            data['phone'] = None
+            hidden = PRIVACY_HIDDEN_FIELDS[instance.privacy_mask]
         
+        data = {}
+        for field in self._readable_fields:
+            if field.field_name in hidden:
+                data[field.field_name] = None
+                continue
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            data[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
         return data
 
 
+# Публичный профиль для UserViewSet: вместо полного списка машин с фото -
+# ограниченный список кратких карточек и общее количество машин
+class PublicUserSerializer(UserSerializer):
+    cars = CarSummarySerializer(many=True, read_only=True)
+    cars_count = serializers.IntegerField(read_only=True)
+    
+    class Meta(UserSerializer.Meta):
+        fields = [
+            field for field in UserSerializer.Meta.fields
+            if field not in ('avatar', 'is_superuser')
+        ] + ['cars_count']
+        read_only_fields = fields
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True)
@@ -214,6 +260,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
+    # Выдать токены доступа вместо сессии (для API-клиентов)
+    issue_tokens = serializers.BooleanField(required=False, default=False)
     
     def validate(self, attrs):
         username = attrs.get('username')
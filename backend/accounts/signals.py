@@ -0,0 +1,76 @@
+# Обработчики сигналов: статистика сообщества по машинам (CarStats)
+# и сброс кэша пользователей для аутентификации
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import User, Car, CarPhoto, CarStats
+from .user_cache import invalidate_cached_user
+
+
+def _car_group_key(car):
+    return CarStats.group_key(car.brand, car.model, car.generation)
+
+
+@receiver(post_save, sender=Car)
+def update_car_stats_on_car_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    key = _car_group_key(instance)
+    if created:
+        CarStats.apply_delta(key, cars=1)
+    else:
+        # В post_save снимок DirtyFieldsMixin еще хранит значения до сохранения.
+        # Машина, которая не загружалась из базы, пропускается -
+        # такие расхождения исправляет команда rebuild_car_stats
+        if instance.get_dirty_fields() is None:
+            return
+        missing = object()
+        old_values = [instance.get_loaded_value(field, missing) for field in ('brand', 'model', 'generation')]
+        if any(value is missing for value in old_values):
+            # Поля группы были отложены (only/defer) - прежняя группа неизвестна
+            return
+        old_key = CarStats.group_key(*old_values)
+        if old_key == key:
+            return
+        # Машина переехала в другую группу вместе со своими фото
+        photos = instance.photos.count()
+        CarStats.apply_delta(old_key, cars=-1, photos=-photos)
+        CarStats.apply_delta(key, cars=1, photos=photos)
+    transaction.on_commit(CarStats.invalidate_cache)
+
+
+@receiver(pre_delete, sender=Car)
+def count_photos_before_car_delete(sender, instance, **kwargs):
+    # Фото удаляются каскадно раньше машины - запоминаем их число заранее
+    instance._stats_photos_count = instance.photos.count()
+
+
+@receiver(post_delete, sender=Car)
+def update_car_stats_on_car_delete(sender, instance, **kwargs):
+    photos = getattr(instance, '_stats_photos_count', 0)
+    CarStats.apply_delta(_car_group_key(instance), cars=-1, photos=-photos)
+    transaction.on_commit(CarStats.invalidate_cache)
+
+
+@receiver(post_save, sender=CarPhoto)
+def update_car_stats_on_photo_save(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    CarStats.apply_photos_delta(instance.car_id, 1)
+    transaction.on_commit(CarStats.invalidate_cache)
+
+
+@receiver(post_delete, sender=CarPhoto)
+def update_car_stats_on_photo_delete(sender, instance, origin=None, **kwargs):
+    # Фото, удаленные вместе с машиной, учтены в update_car_stats_on_car_delete
+    if not (isinstance(origin, CarPhoto) or getattr(origin, 'model', None) is CarPhoto):
+        return
+    CarStats.apply_photos_delta(instance.car_id, -1)
+    transaction.on_commit(CarStats.invalidate_cache)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    # Любое сохранение пользователя (в том числе смена пароля) сбрасывает его снимок
+    invalidate_cached_user(instance.pk)
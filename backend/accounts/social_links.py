@@ -0,0 +1,134 @@
+# Разбор ссылок на социальные сети из профиля пользователя
+#
+# Пользователь может указать как ссылку, так и username (с @ или без).
+# Функции приводят значение к username и полной ссылке. Используются
+# в User.save и в миграции, заполняющей эти поля у существующих пользователей.
+
+
+SOCIAL_NETWORKS = ['instagram', 'telegram', 'youtube', 'vk']
+
+
+def get_instagram_url(value):
+    """Возвращает полную ссылку на Instagram"""
+    if not value:
+        return None
+    if value.startswith('http'):
+        return value
+    # Убираем @ если есть
+    username = value.lstrip('@')
+    return f'https://www.instagram.com/{username}/'
+
+
+def get_instagram_username(value):
+    """Возвращает username Instagram без @"""
+    if not value:
+        return None
+    # Если это ссылка, извлекаем username
+    if 'instagram.com' in value:
+        parts = value.rstrip('/').split('/')
+        username = parts[-1] if parts else None
+        return username.lstrip('@') if username else None
+    return value.lstrip('@')
+
+
+def get_telegram_url(value):
+    """Возвращает полную ссылку на Telegram"""
+    if not value:
+        return None
+    if value.startswith('http'):
+        return value
+    # Убираем @ если есть
+    username = value.lstrip('@')
+    return f'https://t.me/{username}'
+
+
+def get_telegram_username(value):
+    """Возвращает username Telegram без @"""
+    if not value:
+        return None
+    # Если это ссылка, извлекаем username
+    if 't.me' in value or 'telegram.me' in value:
+        parts = value.rstrip('/').split('/')
+        username = parts[-1] if parts else None
+        return username.lstrip('@') if username else None
+    return value.lstrip('@')
+
+
+def get_youtube_url(value):
+    """Возвращает полную ссылку на YouTube"""
+    if not value:
+        return None
+    if value.startswith('http'):
+        return value
+    # Может быть канал или пользователь
+    username = value.lstrip('@')
+    # Пробуем как канал
+    return f'https://www.youtube.com/@{username}'
+
+
+def get_youtube_username(value):
+    """Возвращает username YouTube без @"""
+    if not value:
+        return None
+    # Если это ссылка, извлекаем username
+    if 'youtube.com' in value or 'youtu.be' in value:
+        # Может быть /channel/, /user/, /c/, /@
+        if '/@' in value:
+            parts = value.split('/@')
+            username = parts[-1].split('/')[0] if parts else None
+            return username if username else None
+        elif '/channel/' in value or '/user/' in value or '/c/' in value:
+            parts = value.rstrip('/').split('/')
+            username = parts[-1] if parts else None
+            return username if username else None
+        return None
+    return value.lstrip('@')
+
+
+def get_vk_url(value):
+    """Возвращает полную ссылку на VK"""
+    if not value:
+        return None
+    if value.startswith('http'):
+        return value
+    # Убираем @ если есть
+    username = value.lstrip('@')
+    # Может быть id или username
+    if username.isdigit():
+        return f'https://vk.com/id{username}'
+    return f'https://vk.com/{username}'
+
+
+def get_vk_username(value):
+    """Возвращает username VK без @"""
+    if not value:
+        return None
+    # Если это ссылка, извлекаем username
+    if 'vk.com' in value:
+        parts = value.rstrip('/').split('/')
+        username = parts[-1] if parts else None
+        # Убираем id если есть
+        if username and username.startswith('id'):
+            return username
+        return username if username else None
+    return value.lstrip('@')
+
+
+PARSERS = {
+    'instagram': (get_instagram_username, get_instagram_url),
+    'telegram': (get_telegram_username, get_telegram_url),
+    'youtube': (get_youtube_username, get_youtube_url),
+    'vk': (get_vk_username, get_vk_url),
+}
+
+
+def build_social_links(network, value):
+    """
+    Возвращает {"<network>_username": ..., "<network>_url": ...} для значения,
+    которое пользователь указал в профиле
+    """
+    get_username, get_url = PARSERS[network]
+    return {
+        f'{network}_username': get_username(value),
+        f'{network}_url': get_url(value),
+    }
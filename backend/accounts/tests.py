@@ -0,0 +1,339 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+from .image_processing import CAR_THUMBNAIL_SIZE, PhotoProcessingState, claim_photos, process_photo
+from .models import User, Car, CarPhoto, ThrottleBucket
+from .thumbnails import AVATAR_THUMBNAIL_SIZES, avatar_thumbnail_name
+from .views import PUBLIC_PROFILE_CARS_LIMIT
+
+
+class PublicUserListQueriesTest(APITestCase):
+    """
+    Список публичных профилей загружается фиксированным числом запросов:
+    от количества пользователей, машин и фото оно не зависит
+    """
+    CARS_PER_USER = PUBLIC_PROFILE_CARS_LIMIT + 3
+    PHOTOS_PER_CAR = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            cls.create_user(f'user{i}')
+
+    @classmethod
+    def create_user(cls, username):
+        user = User.objects.create_user(username, email=f'{username}@example.com')
+        for year in range(2000, 2000 + cls.CARS_PER_USER):
+            car = Car.objects.create(user=user, brand='BMW', model='M3', year=year)
+            CarPhoto.objects.bulk_create([
+                CarPhoto(car=car, photo=f'cars/photos/{username}_{year}_{i}.jpg', is_primary=(i == 0))
+                for i in range(cls.PHOTOS_PER_CAR)
+            ])
+        return user
+
+    def get_users(self, expected_count):
+        # COUNT для пагинации, пользователи, машины, основные фото
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/accounts/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), expected_count)
+        return response.data['results']
+
+    def test_cars_limited_and_counted(self):
+        for user in self.get_users(5):
+            self.assertEqual(user['cars_count'], self.CARS_PER_USER)
+            self.assertEqual(len(user['cars']), PUBLIC_PROFILE_CARS_LIMIT)
+            # Показываются последние добавленные машины
+            years = [car['year'] for car in user['cars']]
+            self.assertEqual(years, sorted(years, reverse=True))
+            for car in user['cars']:
+                self.assertEqual(car['photos_count'], self.PHOTOS_PER_CAR)
+                self.assertIn(f"{user['username']}_{car['year']}_0.jpg", car['photo_url'])
+
+    def test_query_count_does_not_grow(self):
+        self.get_users(5)
+        for i in range(5, 15):
+            self.create_user(f'user{i}')
+        self.get_users(15)
+
+
+def make_image(name, format='PNG', size=(300, 300)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format=format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+class MediaRootMixin:
+    """Файлы теста пишутся во временную папку"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class AvatarThumbnailsTest(MediaRootMixin, TestCase):
+    """
+    Миниатюры аватаров: отдельные для каждого файла и создаются после коммита
+    """
+
+    def set_avatar(self, user, name, format='PNG'):
+        user.avatar = make_image(name, format)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+    def thumbnails_exist(self, name):
+        return [default_storage.exists(avatar_thumbnail_name(name, size)) for size in AVATAR_THUMBNAIL_SIZES]
+
+    def test_same_stem_avatars_do_not_share_thumbnails(self):
+        first = User.objects.create_user('first')
+        second = User.objects.create_user('second')
+        self.set_avatar(first, 'me.png')
+        self.set_avatar(second, 'me.jpg', 'JPEG')
+        self.assertNotEqual(
+            avatar_thumbnail_name(first.avatar.name, 64), avatar_thumbnail_name(second.avatar.name, 64)
+        )
+        # Замена аватара второго пользователя не трогает миниатюры первого
+        self.set_avatar(second, 'other.png')
+        self.assertTrue(all(self.thumbnails_exist(first.avatar.name)))
+
+    def test_replaced_avatar_thumbnails_deleted(self):
+        user = User.objects.create_user('owner')
+        self.set_avatar(user, 'old.png')
+        old_name = user.avatar.name
+        user = User.objects.get(pk=user.pk)
+        self.set_avatar(user, 'new.png')
+        self.assertFalse(any(self.thumbnails_exist(old_name)))
+        self.assertTrue(all(self.thumbnails_exist(user.avatar.name)))
+        self.assertTrue(User.objects.get(pk=user.pk).has_avatar_thumbnails)
+
+    def test_rollback_leaves_no_thumbnails(self):
+        user = User.objects.create_user('rollback')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    user.avatar = make_image('rolled.png')
+                    user.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertFalse(any(self.thumbnails_exist(user.avatar.name)))
+
+
+class PhotoQueueTest(MediaRootMixin, TestCase):
+    """
+    Очередь обработки фото машин
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('driver')
+
+    def test_car_without_photo_is_ready(self):
+        car = Car.objects.create(user=self.user, brand='BMW', model='M3', year=2000)
+        self.assertEqual(car.processing_state, PhotoProcessingState.READY)
+        self.assertEqual(claim_photos(Car, 10), [])
+
+    def test_replacing_photo_deletes_old_processed_copy(self):
+        car = Car.objects.create(
+            user=self.user, brand='BMW', model='M3', year=2000, photo=make_image('car.jpg', 'JPEG', (800, 600))
+        )
+        self.assertEqual(car.processing_state, PhotoProcessingState.PENDING)
+        [claimed] = claim_photos(Car, 10)
+        self.assertTrue(process_photo(claimed))
+        car = Car.objects.get(pk=car.pk)
+        processed_name = car.photo_processed.name
+        thumbnail_name = car.photo_thumbnail.name
+        self.assertTrue(default_storage.exists(processed_name))
+        self.assertTrue(default_storage.exists(thumbnail_name))
+
+        car.photo = make_image('new.jpg', 'JPEG', (800, 600))
+        with self.captureOnCommitCallbacks(execute=True):
+            car.save()
+        self.assertFalse(default_storage.exists(processed_name))
+        self.assertFalse(default_storage.exists(thumbnail_name))
+        car = Car.objects.get(pk=car.pk)
+        self.assertEqual(car.processing_state, PhotoProcessingState.PENDING)
+        self.assertFalse(car.photo_processed)
+        self.assertFalse(car.photo_thumbnail)
+
+    def test_removing_photo_marks_ready(self):
+        car = Car.objects.create(
+            user=self.user, brand='BMW', model='M3', year=2000, photo=make_image('car.jpg', 'JPEG', (800, 600))
+        )
+        car = Car.objects.get(pk=car.pk)
+        car.photo = None
+        car.save()
+        self.assertEqual(Car.objects.get(pk=car.pk).processing_state, PhotoProcessingState.READY)
+
+
+class CarGalleryThumbnailTest(MediaRootMixin, APITestCase):
+    """
+    Галерея отдает миниатюру основного фото, а не фото в полном размере
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('gallery')
+        self.car = Car.objects.create(user=user, brand='BMW', model='M3', year=2000)
+        CarPhoto.objects.create(car=self.car, photo=make_image('car.jpg', 'JPEG', (1600, 1200)), is_primary=True)
+
+    def get_thumbnail_url(self):
+        response = self.client.get('/api/accounts/car-gallery/')
+        self.assertEqual(response.status_code, 200)
+        [car] = response.data['results']
+        return car['thumbnail_url']
+
+    def test_original_served_until_processed(self):
+        self.assertIn('car', self.get_thumbnail_url())
+        self.assertNotIn('thumbnails', self.get_thumbnail_url())
+
+    def test_thumbnail_served_after_processing(self):
+        [claimed] = claim_photos(CarPhoto, 10)
+        self.assertTrue(process_photo(claimed))
+        photo = CarPhoto.objects.get(pk=claimed.pk)
+        with default_storage.open(photo.photo_thumbnail.name) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, CAR_THUMBNAIL_SIZE)
+        self.assertTrue(self.get_thumbnail_url().endswith(photo.photo_thumbnail.url))
+
+    def test_missing_thumbnails_backfilled(self):
+        [claimed] = claim_photos(CarPhoto, 10)
+        process_photo(claimed)
+        # Фото обработано до появления миниатюр
+        CarPhoto.objects.filter(pk=claimed.pk).update(photo_thumbnail='')
+        call_command('process_car_photos', '--thumbnails', stdout=StringIO())
+        photo = CarPhoto.objects.get(pk=claimed.pk)
+        self.assertTrue(default_storage.exists(photo.photo_thumbnail.name))
+
+
+class TokenRevocationTest(APITestCase):
+    """
+    Выход по токену и смена пароля отзывают выданные токены
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('api_client', password='old-password-123')
+
+    def issue_tokens(self, password='old-password-123'):
+        response = self.client.post(
+            '/api/auth/login/', {'username': 'api_client', 'password': password, 'issue_tokens': True}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['tokens']
+
+    def get_me(self, tokens):
+        return self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def refresh(self, tokens):
+        return self.client.post('/api/auth/refresh/', {'refresh': tokens['refresh']})
+
+    def assertRevoked(self, tokens):
+        # Первым в списке аутентификации стоит SessionAuthentication - DRF отвечает 403
+        response = self.get_me(tokens)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['detail'], 'Токен отозван')
+        response = self.refresh(tokens)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['error'], 'Токен отозван')
+
+    def test_tokens_accepted(self):
+        tokens = self.issue_tokens()
+        self.assertEqual(self.get_me(tokens).status_code, 200)
+        self.assertEqual(self.refresh(tokens).status_code, 200)
+
+    def test_logout_revokes_tokens(self):
+        tokens = self.issue_tokens()
+        other_device = self.issue_tokens()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/logout/', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(response.status_code, 200)
+        # Выход на всех устройствах
+        for issued in (tokens, other_device):
+            self.assertRevoked(issued)
+        self.assertEqual(self.get_me(self.issue_tokens()).status_code, 200)
+
+    def test_password_change_revokes_tokens(self):
+        tokens = self.issue_tokens()
+        self.assertEqual(self.get_me(tokens).status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password-456')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertRevoked(tokens)
+        self.assertEqual(self.get_me(self.issue_tokens('new-password-456')).status_code, 200)
+
+
+class LoginThrottleTest(APITestCase):
+    """
+    Ограничение частоты входа: корзины токенов в базе
+    (по умолчанию 5 попыток на username и 20 на IP в минуту)
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        patcher = mock.patch('accounts.throttling.time')
+        self.time = patcher.start()
+        self.time.time.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+
+    def attempt(self, username='victim'):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': 'wrong'})
+
+    def test_limit_and_429(self):
+        for _ in range(5):
+            self.assertEqual(self.attempt().status_code, 400)
+        response = self.attempt()
+        self.assertEqual(response.status_code, 429)
+        # Следующий токен - через 60 / 5 = 12 секунд
+        self.assertEqual(response['Retry-After'], '12')
+        # Отклоненная попытка не расходует токен IP - другой username проходит
+        self.assertEqual(self.attempt('other').status_code, 400)
+        self.assertEqual(ThrottleBucket.objects.get(key__contains=':ip:').tokens, 20 - 6)
+
+    def test_no_burst_at_window_boundary(self):
+        # Счетчик по минутам пропустил бы 5 попыток в конце минуты и 5 в начале следующей
+        self.now = 1_000_019.9
+        for _ in range(5):
+            self.assertEqual(self.attempt().status_code, 400)
+        self.now = 1_000_020.1
+        self.assertEqual(self.attempt().status_code, 429)
+
+    def test_tokens_refill_gradually(self):
+        for _ in range(5):
+            self.attempt()
+        self.now += 12
+        self.assertEqual(self.attempt().status_code, 400)
+        self.assertEqual(self.attempt().status_code, 429)
+
+    def test_limit_does_not_depend_on_cache(self):
+        for _ in range(5):
+            self.attempt()
+            cache.clear()
+        self.assertEqual(self.attempt().status_code, 429)
+
+    def test_purge_full_buckets(self):
+        self.attempt()
+        self.now += 3601
+        self.attempt('recent')
+        with mock.patch('accounts.management.commands.purge_throttle_buckets.time', self.time):
+            call_command('purge_throttle_buckets', stdout=StringIO())
+        # Остались корзины IP и username 'recent', корзина 'victim' давно наполнилась
+        self.assertEqual(ThrottleBucket.objects.count(), 2)
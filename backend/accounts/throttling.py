@@ -0,0 +1,160 @@
+# Ограничение частоты входа и регистрации
+#
+# Каждая попытка входа - полный расчет PBKDF2, поэтому подбор паролей
+# быстро занимает все процессоры. Ограничение проверяется DRF до вызова
+# обработчика, то есть до authenticate() и хэширования пароля.
+import hashlib
+import time
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+from .models import ThrottleBucket
+
+
+# Счетчики отклоненных запросов: throttle_rejections:<scope>:<ip|username>
+REJECTIONS_CACHE_KEY = 'throttle_rejections:{scope}:{kind}'
+THROTTLE_KINDS = ('ip', 'username')
+
+
+def parse_rate(rate):
+    """
+    '5/min' -> (5, 60): емкость корзины и за сколько секунд пустая
+    корзина наполняется заново
+    """
+    num, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(num), seconds
+
+
+def record_rejection(scope, kind):
+    key = REJECTIONS_CACHE_KEY.format(scope=scope, kind=kind)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключ успели удалить между add и incr
+        cache.set(key, 1, None)
+
+
+def get_rejection_counters(scopes):
+    # {scope: {"ip": n, "username": n}} - сколько запросов отклонено с момента запуска кэша
+    keys = {
+        (scope, kind): REJECTIONS_CACHE_KEY.format(scope=scope, kind=kind)
+        for scope in scopes for kind in THROTTLE_KINDS
+    }
+    values = cache.get_many(keys.values())
+    counters = {scope: {} for scope in scopes}
+    for (scope, kind), key in keys.items():
+        counters[scope][kind] = values.get(key, 0)
+    return counters
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Корзина токенов отдельно для IP-адреса и для username из тела запроса.
+
+    Корзина вмещает N токенов и пополняется равномерно: по одному токену
+    каждые period/N секунд из DEFAULT_THROTTLE_RATES '<scope>_ip'
+    и '<scope>_username'. Например, '5/min' - не больше 5 попыток подряд,
+    затем одна попытка в 12 секунд. В отличие от счетчика по окнам,
+    на стыке двух окон нельзя сделать 2N попыток.
+    Запрос проходит, только если токен есть в обеих корзинах.
+
+    Корзины - строки ThrottleBucket в базе: пополнение и взятие токена
+    выполняются одним условным UPDATE, поэтому параллельные запросы из
+    разных процессов не могут взять один и тот же токен.
+    """
+    scope = None
+
+    def __init__(self):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        self.rates = {
+            kind: parse_rate(rates[f'{self.scope}_{kind}'])
+            for kind in THROTTLE_KINDS
+            if rates.get(f'{self.scope}_{kind}')
+        }
+        self.wait_seconds = None
+
+    def get_bucket_keys(self, request):
+        keys = {'ip': f'throttle:{self.scope}:ip:{self.get_ident(request)}'}
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if isinstance(username, str) and username.strip():
+            # В ключ - хэш, а не сам username
+            digest = hashlib.md5(username.strip().casefold().encode()).hexdigest()
+            keys['username'] = f'throttle:{self.scope}:username:{digest}'
+        return {kind: key for kind, key in keys.items() if kind in self.rates}
+
+    @staticmethod
+    def take_token(key, capacity, period, now):
+        """
+        Пополняет корзину key на время, прошедшее с прошлого пополнения,
+        и берет из нее токен. Возвращает False, если токенов нет.
+        """
+        rate = capacity / period
+        elapsed = Value(now) - F('refilled_at')
+        bucket = ThrottleBucket.objects.filter(
+            key=key,
+            # Токен есть, если после пополнения их не меньше одного
+            tokens__gte=Value(1.0) - elapsed * Value(rate),
+        )
+        take = {
+            'tokens': Least(Value(float(capacity)), F('tokens') + elapsed * Value(rate)) - Value(1.0),
+            'refilled_at': now,
+        }
+        if bucket.update(**take):
+            return True
+        _, created = ThrottleBucket.objects.get_or_create(
+            key=key, defaults={'tokens': capacity - 1, 'refilled_at': now}
+        )
+        if created:
+            return True
+        # Корзину мог только что создать параллельный запрос
+        return bool(bucket.update(**take))
+
+    @staticmethod
+    def return_token(key, capacity):
+        ThrottleBucket.objects.filter(key=key).update(
+            tokens=Least(Value(float(capacity)), F('tokens') + Value(1.0))
+        )
+
+    @staticmethod
+    def get_wait_seconds(key, capacity, period, now):
+        # Через сколько секунд в корзине появится токен
+        bucket = ThrottleBucket.objects.filter(key=key).values('tokens', 'refilled_at').first()
+        if bucket is None:
+            return 0
+        rate = capacity / period
+        tokens = min(capacity, bucket['tokens'] + (now - bucket['refilled_at']) * rate)
+        return max(0, (1 - tokens) / rate)
+
+    def allow_request(self, request, view):
+        keys = self.get_bucket_keys(request)
+        if not keys:
+            return True
+        now = time.time()
+
+        taken = []
+        for kind, key in keys.items():
+            capacity, period = self.rates[kind]
+            if not self.take_token(key, capacity, period, now):
+                # Возвращаем токены, взятые из других корзин для этого запроса
+                for taken_kind, taken_key in taken:
+                    self.return_token(taken_key, self.rates[taken_kind][0])
+                self.wait_seconds = self.get_wait_seconds(key, capacity, period, now)
+                record_rejection(self.scope, kind)
+                return False
+            taken.append((kind, key))
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class RegisterThrottle(TokenBucketThrottle):
+    scope = 'register'
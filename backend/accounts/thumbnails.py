@@ -0,0 +1,74 @@
+# Уменьшенные копии аватаров фиксированных размеров
+#
+# Миниатюры хранятся рядом с оригиналом: users/avatars/2025/01/01/me.png ->
+# users/avatars/2025/01/01/me.png_64.jpg. Расширение оригинала остается
+# в имени, чтобы me.png и me.jpg из одной папки не делили миниатюры.
+# Пока миниатюры не созданы (User.has_avatar_thumbnails=False), вместо них
+# отдается оригинал.
+from io import BytesIO
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+# Размеры квадратных миниатюр в пикселях - клиент берет наименьший подходящий
+AVATAR_THUMBNAIL_SIZES = (32, 64, 128, 256)
+# Размер для карточек авторов в списках (форум, мероприятия)
+AVATAR_LIST_SIZE = 64
+
+
+def avatar_thumbnail_name(name, size):
+    # Имя файла миниатюры для аватара с именем name (полное имя в хранилище)
+    return f'{name}_{size}.jpg'
+
+
+def generate_avatar_thumbnails(avatar):
+    """
+    Создает миниатюры всех размеров для сохраненного аватара (FieldFile).
+    Изображение обрезается по центру до квадрата, существующие миниатюры
+    перезаписываются.
+    """
+    storage = avatar.storage
+    with storage.open(avatar.name, 'rb') as source:
+        img = Image.open(source)
+        # Учитываем поворот из EXIF (фото с телефона)
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        for size in AVATAR_THUMBNAIL_SIZES:
+            thumbnail = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            thumbnail.save(buffer, format='JPEG', quality=85, optimize=True)
+            name = avatar_thumbnail_name(avatar.name, size)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def delete_avatar_thumbnails(storage, name):
+    # Удаляет миниатюры аватара с именем name (например, после замены аватара)
+    for size in AVATAR_THUMBNAIL_SIZES:
+        thumbnail_name = avatar_thumbnail_name(name, size)
+        if storage.exists(thumbnail_name):
+            storage.delete(thumbnail_name)
+
+
+def get_avatar_url(user, size=None, request=None):
+    """
+    Ссылка на аватар нужного размера. Если миниатюр еще нет или размер
+    не указан - ссылка на оригинал.
+    """
+    if not user.avatar:
+        return None
+    if size is not None and user.has_avatar_thumbnails:
+        url = user.avatar.storage.url(avatar_thumbnail_name(user.avatar.name, size))
+    else:
+        url = user.avatar.url
+    return request.build_absolute_uri(url) if request else url
+
+
+def get_avatar_urls(user, request=None):
+    # Ссылки на все размеры: {"32": url, "64": url, ...}
+    if not user.avatar:
+        return None
+    return {str(size): get_avatar_url(user, size, request) for size in AVATAR_THUMBNAIL_SIZES}
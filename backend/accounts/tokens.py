@@ -0,0 +1,141 @@
+# Подписанные токены доступа для API-клиентов
+#
+# Токен - данные {"uid": id пользователя, "ver": версия токенов, "typ": вид}
+# с меткой времени, подписанные HMAC (django.core.signing, SECRET_KEY).
+# Подпись и срок действия проверяются без обращения к базе.
+#
+# Отзыв: у пользователя есть token_version - при смене пароля или выходе
+# она увеличивается, и токены с меньшей версией перестают действовать.
+# Текущие версии пользователей лежат в общем кэше, у процесса - их локальная
+# копия, которая сбрасывается, только когда меняется версия списка отзывов.
+import uuid
+from datetime import timedelta
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from .user_cache import invalidate_cached_user
+
+
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=15)
+REFRESH_TOKEN_LIFETIME = timedelta(days=14)
+TOKEN_LIFETIMES = {
+    'access': ACCESS_TOKEN_LIFETIME,
+    'refresh': REFRESH_TOKEN_LIFETIME,
+}
+# Разная соль - токен одного вида не подойдет вместо другого
+TOKEN_SALTS = {
+    'access': 'accounts.tokens.access',
+    'refresh': 'accounts.tokens.refresh',
+}
+# Версия списка отзывов в общем кэше - меняется при каждом отзыве
+REVOCATIONS_VERSION_CACHE_KEY = 'auth_tokens:revocations'
+# Сколько версий пользователей держать в памяти процесса
+MAX_LOCAL_TOKEN_VERSIONS = 10000
+
+# Локальная копия: (версия списка отзывов, {user_id: token_version})
+_revocations = (None, {})
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def token_version_cache_key(user_id):
+    return f'auth_tokens:version:{user_id}'
+
+
+def issue_token(user, token_type='access'):
+    payload = {'uid': user.pk, 'ver': user.token_version, 'typ': token_type}
+    return signing.dumps(payload, salt=TOKEN_SALTS[token_type])
+
+
+def issue_tokens(user):
+    # Пара токенов для ответа на вход
+    return {
+        'access': issue_token(user, 'access'),
+        'refresh': issue_token(user, 'refresh'),
+        'access_expires_in': int(ACCESS_TOKEN_LIFETIME.total_seconds()),
+    }
+
+
+def _get_revocations_version():
+    version = cache.get(REVOCATIONS_VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(REVOCATIONS_VERSION_CACHE_KEY, version, None):
+            version = cache.get(REVOCATIONS_VERSION_CACHE_KEY)
+    return version
+
+
+def get_token_version(user_id):
+    """
+    Текущая версия токенов пользователя или None, если пользователя нет.
+    Берется из памяти процесса, пока не изменилась версия списка отзывов,
+    иначе из общего кэша (и только при его промахе - из базы).
+    """
+    global _revocations
+    from .models import User
+
+    version = _get_revocations_version()
+    cached_version, versions = _revocations
+    if cached_version != version or len(versions) >= MAX_LOCAL_TOKEN_VERSIONS:
+        versions = {}
+        _revocations = (version, versions)
+
+    if user_id not in versions:
+        key = token_version_cache_key(user_id)
+        token_version = cache.get(key)
+        if token_version is None:
+            token_version = User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+            if token_version is None:
+                return None
+            cache.set(key, token_version, int(REFRESH_TOKEN_LIFETIME.total_seconds()))
+        versions[user_id] = token_version
+    return versions[user_id]
+
+
+def verify_token(token, token_type='access'):
+    """
+    Проверяет подпись, срок действия, вид и версию токена.
+    Возвращает данные токена или выбрасывает InvalidToken.
+    """
+    try:
+        payload = signing.loads(
+            token,
+            salt=TOKEN_SALTS[token_type],
+            max_age=TOKEN_LIFETIMES[token_type]
+        )
+    except signing.SignatureExpired:
+        raise InvalidToken('Срок действия токена истек')
+    except signing.BadSignature:
+        raise InvalidToken('Неверный токен')
+    if not isinstance(payload, dict) or payload.get('typ') != token_type:
+        raise InvalidToken('Неверный токен')
+    current_version = get_token_version(payload['uid'])
+    if current_version is None or payload['ver'] < current_version:
+        raise InvalidToken('Токен отозван')
+    return payload
+
+
+def publish_token_version(user_id, token_version):
+    """
+    Записывает новую версию токенов пользователя в общий кэш и меняет
+    версию списка отзывов - процессы сбросят свои локальные копии
+    """
+    cache.set(token_version_cache_key(user_id), token_version, int(REFRESH_TOKEN_LIFETIME.total_seconds()))
+    cache.set(REVOCATIONS_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def revoke_user_tokens(user):
+    """
+    Отзывает все выданные пользователю токены (выход на всех устройствах)
+    """
+    from .models import User
+
+    User.objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
+    user.token_version = User.objects.filter(pk=user.pk).values_list('token_version', flat=True).get()
+    # update() не вызывает сигналы - снимок пользователя сбрасываем сами
+    invalidate_cached_user(user.pk)
+    user_id, token_version = user.pk, user.token_version
+    transaction.on_commit(lambda: publish_token_version(user_id, token_version))
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AuthViewSet, CarViewSet, CarPhotoViewSet, UserViewSet
+from .views import AuthViewSet, CarViewSet, CarGalleryViewSet, CarPhotoViewSet, CarStatsViewSet, UserViewSet
 
 router = DefaultRouter()
 # Не добавляем 'auth' здесь, так как он уже есть в главном urls.py (api/auth/)
@@ -8,6 +8,8 @@ router.register(r'', AuthViewSet, basename='auth')
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'cars', CarViewSet, basename='car')
 router.register(r'car-photos', CarPhotoViewSet, basename='car-photo')
+router.register(r'car-stats', CarStatsViewSet, basename='car-stats')
+router.register(r'car-gallery', CarGalleryViewSet, basename='car-gallery')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -0,0 +1,68 @@
+# Кэш пользователей для аутентификации по сессии
+#
+# На каждом запросе Django загружает пользователя по id из сессии.
+# Вместо полной строки accounts_user в общем кэше хранится "облегченный"
+# снимок: поля, нужные для проверки прав, без bio, соцсетей и хэша пароля.
+# Для проверки подписи сессии рядом хранится get_session_auth_hash().
+# Остальные поля у такого пользователя отложенные (deferred) и загружаются
+# из базы только при обращении к ним.
+from django.core.cache import cache
+from django.db import router, transaction
+from .social_links import SOCIAL_NETWORKS
+
+
+# Версия формата снимка - увеличить при изменении USER_CACHE_FIELDS
+USER_CACHE_VERSION = 3
+USER_CACHE_TIMEOUT = 60 * 60
+# Поля, которые не попадают в снимок
+USER_CACHE_EXCLUDED_FIELDS = frozenset(
+    ['password', 'bio', *SOCIAL_NETWORKS]
+    + [f'{network}_{suffix}' for network in SOCIAL_NETWORKS for suffix in ('username', 'url')]
+)
+
+
+def user_cache_key(user_id):
+    return f'auth_user:{USER_CACHE_VERSION}:{user_id}'
+
+
+def get_user_cache_fields(model):
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname not in USER_CACHE_EXCLUDED_FIELDS
+    ]
+
+
+def get_cached_user(user_id):
+    """
+    Пользователь по id: из кэша или одним запросом к базе (с сохранением
+    в кэш). Возвращает экземпляр с отложенными полями или None.
+    """
+    from .models import User
+
+    fields = get_user_cache_fields(User)
+    key = user_cache_key(user_id)
+    cached = cache.get(key)
+    if cached is None:
+        row = User.objects.filter(pk=user_id).values_list(*fields, 'password').first()
+        if row is None:
+            return None
+        # Хэш пароля в кэш не попадает - только производная от него подпись сессии
+        cached = (row[:-1], User(password=row[-1]).get_session_auth_hash())
+        cache.set(key, cached, USER_CACHE_TIMEOUT)
+    values, session_auth_hash = cached
+    # from_db помечает не переданные поля как отложенные
+    user = User.from_db(router.db_for_read(User), fields, values)
+    user.cached_session_auth_hash = session_auth_hash
+    return user
+
+
+def invalidate_cached_user(user_id):
+    """
+    Сбрасывает снимок пользователя - сразу и после коммита, чтобы
+    параллельный запрос не успел положить в кэш данные до коммита.
+    Вызывается из post_save и после User.objects...update(), который
+    сигналы не вызывает.
+    """
+    key = user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -1,57 +1,124 @@
 # API для входа, регистрации и управления машинами
-from rest_framework import status, viewsets
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.contrib.auth import login, logout
-from .models import User, Car, CarPhoto
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Case, Count, Exists, F, OuterRef, Prefetch, Q, Value, When, Window
+)
+from django.db.models.functions import RowNumber
+from shop.guest_cart import merge_guest_cart
+from tuning_studio.pagination import KeysetPagination
+from .authentication import SignedTokenAuthentication
+from .author_cards import AuthorCardsMixin
+from .autocomplete import AUTOCOMPLETE_FIELDS, get_autocomplete_index
+from .image_processing import delete_prepared_photos, prepare_uploaded_photo
+from .models import User, Car, CarPhoto, CarStats
+from .throttling import LoginThrottle, RegisterThrottle, get_rejection_counters
+from .tokens import (
+    ACCESS_TOKEN_LIFETIME, InvalidToken, issue_token, issue_tokens, revoke_user_tokens, verify_token
+)
+from .user_cache import get_cached_user
 from .serializers import (
-    UserSerializer, UserRegistrationSerializer, LoginSerializer, CarSerializer, CarPhotoSerializer
+    UserSerializer, PublicUserSerializer, UserRegistrationSerializer, LoginSerializer,
+    CarSerializer, CarPhotoSerializer, CarPhotoBulkUploadSerializer, CarStatsSerializer,
+    GalleryCarSerializer
 )
 
 
-# API для входа и регистрации - использует сессии Django
+# Сколько машин показывать в публичном профиле (всего машин - в cars_count)
+PUBLIC_PROFILE_CARS_LIMIT = 12
+# Сколько потоков обрабатывают фото при массовой загрузке
+CAR_PHOTO_UPLOAD_WORKERS = 4
+# Сколько секунд хранить страницы статистики сообщества
+# (при изменении статистики кэш сбрасывается сменой версии)
+CAR_STATS_CACHE_TIMEOUT = 60 * 10
+
+
+# API для входа и регистрации - использует сессии Django или подписанные токены
 class AuthViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=[RegisterThrottle])
     def register(self, request):
         # Регистрация нового пользователя - сразу входит в систему
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            login(request, user)  # Автоматический вход после регистрации
+            # Автоматический вход после регистрации. Бэкендов несколько (settings.AUTHENTICATION_BACKENDS),
+            # поэтому указываем, через какой загружать пользователя сессии
+            login(request, user, backend='accounts.backends.CachedUserBackend')
+            merge_guest_cart(request, user)  # Переносим гостевую корзину из сессии
             # Передаем контекст запроса, чтобы пользователь видел свои данные
             return Response(UserSerializer(user, context={'request': request}).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=[LoginThrottle])
     def login(self, request):
         # Вход в систему - проверяет логин/пароль и создает сессию
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
+            if serializer.validated_data['issue_tokens']:
+                # API-клиент: вместо сессии - пара подписанных токенов
+                user_logged_in.send(sender=user.__class__, request=request, user=user)
+                data = UserSerializer(user, context={'request': request}).data
+                data['tokens'] = issue_tokens(user)
+                return Response(data)
             login(request, user)  # Создание сессии
+            merge_guest_cart(request, user)  # Переносим гостевую корзину из сессии
             # Передаем контекст запроса, чтобы пользователь видел свои данные
             return Response(UserSerializer(user, context={'request': request}).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def refresh(self, request):
+        # Новый access-токен по refresh-токену - без запросов к базе
+        try:
+            payload = verify_token(request.data.get('refresh') or '', 'refresh')
+        except InvalidToken as e:
+            return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        user = get_cached_user(payload['uid'])
+        if user is None or not user.is_active:
+            return Response({'error': 'Пользователь не найден или заблокирован'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({
+            'access': issue_token(user, 'access'),
+            'access_expires_in': int(ACCESS_TOKEN_LIFETIME.total_seconds()),
+        })
+    
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def logout(self, request):
-        # Выход из системы - удаляет сессию
+        # Выход из системы - удаляет сессию, а при входе по токену отзывает все токены
+        if isinstance(request.successful_authenticator, SignedTokenAuthentication):
+            revoke_user_tokens(request.user)
         logout(request)
         return Response({'message': 'Вы вышли из системы'})
     
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def throttle_stats(self, request):
+        # Сколько попыток входа и регистрации отклонено ограничением частоты (для мониторинга)
+        return Response(get_rejection_counters([LoginThrottle.scope, RegisterThrottle.scope]))
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
         # Возвращает данные текущего пользователя и его машины
-        serializer = UserSerializer(request.user, context={'request': request})
+        # request.user - облегченный снимок из кэша, профиль загружаем целиком.
+        # Машины с фото загружаются двумя запросами, а не запросом на каждую машину
+        user = User.objects.prefetch_related('cars__photos').get(pk=request.user.pk)
+        serializer = UserSerializer(user, context={'request': request})
         return Response(serializer.data)
     
     @action(detail=False, methods=['patch', 'put'], permission_classes=[IsAuthenticated])
     def update_profile(self, request):
         # Обновление профиля пользователя (включая аватар)
-        user = request.user
+        # request.user - снимок из кэша без bio и соцсетей, сохраняем полную запись
+        user = User.objects.get(pk=request.user.pk)
         serializer = UserSerializer(user, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
@@ -65,8 +132,29 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     ViewSet для просмотра профилей пользователей
     """
     queryset = User.objects.all()
-    serializer_class = UserSerializer
+    serializer_class = PublicUserSerializer
     permission_classes = [AllowAny]  # Разрешаем просмотр профилей всем
+    # Поиск по соцсетям: /users/?telegram_username=durov
+    filterset_fields = ['instagram_username', 'telegram_username', 'youtube_username', 'vk_username']
+    
+    def get_queryset(self):
+        # Машины и их основные фото загружаются фиксированным числом запросов
+        # на всю страницу, независимо от количества пользователей и машин
+        cars = Car.objects.annotate(
+            photos_count=Count('photos'),
+            # Номер машины среди машин владельца - чтобы взять только последние
+            position=Window(RowNumber(), partition_by=F('user_id'), order_by=F('created_at').desc()),
+        ).filter(
+            position__lte=PUBLIC_PROFILE_CARS_LIMIT
+        ).prefetch_related(
+            Prefetch('photos', queryset=CarPhoto.objects.filter(is_primary=True), to_attr='primary_photos')
+        ).order_by('-created_at')
+        # order_by обязателен: с агрегацией Meta.ordering не применяется
+        return User.objects.annotate(
+            cars_count=Count('cars')
+        ).prefetch_related(
+            Prefetch('cars', queryset=cars)
+        ).order_by('-created_at')
     
     def get_serializer_context(self):
         """
@@ -77,6 +165,93 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
         return context
 
 
+# Статистика сообщества: сколько машин каждой марки, модели и поколения
+class CarStatsViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Список групп марка / модель / поколение с количеством машин и фото.
+    Поиск по началу марки и модели: /car-stats/?brand=toy&model=mark
+    """
+    serializer_class = CarStatsSerializer
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        queryset = CarStats.objects.all()
+        # Car.save приводит марку и модель к виду title() - делаем так же с запросом
+        brand = self.request.query_params.get('brand', '').strip()
+        if brand:
+            queryset = queryset.filter(brand__startswith=brand.title())
+        model = self.request.query_params.get('model', '').strip()
+        if model:
+            queryset = queryset.filter(model__startswith=model.title())
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Страница кэшируется целиком, включая ссылки пагинации
+        url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        key = f'car_stats:{CarStats.cache_version()}:{url_hash}'
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, CAR_STATS_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Подсказки для формы машины по началу строки q:
+        /car-stats/autocomplete/?field=brand&q=toy
+        /car-stats/autocomplete/?field=model&brand=Toyota&q=ma
+        /car-stats/autocomplete/?field=generation&brand=Toyota&model=Mark II&q=jz
+        Отвечает из дерева в памяти процесса, без запросов к базе.
+        """
+        field = request.query_params.get('field', 'brand')
+        if field not in AUTOCOMPLETE_FIELDS:
+            return Response(
+                {'error': f'Параметр field должен быть одним из: {", ".join(AUTOCOMPLETE_FIELDS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        results = get_autocomplete_index().suggest(
+            field,
+            request.query_params.get('q', ''),
+            brand=request.query_params.get('brand'),
+            model=request.query_params.get('model'),
+        )
+        return Response({'results': results})
+
+
+# Общая галерея машин сообщества - от новых к старым
+class CarGalleryViewSet(AuthorCardsMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Машины всех пользователей, у которых есть фото, с основным фото и карточкой
+    владельца. Фильтры: ?brand=Toyota&generation=JZX90.
+
+    Пагинация по ключу (created_at, id): следующая страница - по ссылке next.
+    Каждая страница - три запроса: машины, основные фото, карточки владельцев.
+    """
+    serializer_class = GalleryCarSerializer
+    permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = Car.objects.filter(
+            Exists(CarPhoto.objects.filter(car=OuterRef('pk')))
+            | (Q(photo__isnull=False) & ~Q(photo=''))
+        ).prefetch_related(
+            Prefetch('photos', queryset=CarPhoto.objects.filter(is_primary=True), to_attr='primary_photos')
+        )
+        # Значения приводим к виду, в котором их сохраняет Car.save
+        brand = self.request.query_params.get('brand', '').strip()
+        if brand:
+            queryset = queryset.filter(brand=brand.title())
+        generation = self.request.query_params.get('generation', '').strip()
+        if generation:
+            queryset = queryset.filter(generation=generation.upper())
+        return queryset
+
+    def get_author_ids(self, instances):
+        return [car.user_id for car in instances]
+
+
 # API для управления машинами - каждый видит только свои
 class CarViewSet(viewsets.ModelViewSet):
     serializer_class = CarSerializer
@@ -148,3 +323,58 @@ class CarPhotoViewSet(viewsets.ModelViewSet):
             from rest_framework.exceptions import ValidationError
             raise ValidationError("Не указан автомобиль")
 
+
+    @action(detail=False, methods=['post'])
+    def bulk_upload(self, request):
+        """
+        Загрузка нескольких фото автомобиля одним запросом.
+
+        Владелец машины проверяется один раз, фото обрабатываются
+        параллельно в нескольких потоках и сохраняются одним bulk_create.
+        Основным становится фото primary_index, а если он не указан и у машины
+        еще нет основного фото - первое из загруженных.
+        """
+        serializer = CarPhotoBulkUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        car = Car.objects.filter(pk=data['car'], user=request.user).only('id').first()
+        if car is None:
+            from rest_framework.exceptions import PermissionDenied
+            raise PermissionDenied("Автомобиль не найден или не принадлежит вам")
+
+        uploads = data['photos']
+        photos = [CarPhoto(car=car) for _ in uploads]
+        primary_index = data.get('primary_index')
+        try:
+            # Потоки не обращаются к базе - только к хранилищу файлов и Pillow
+            workers = min(CAR_PHOTO_UPLOAD_WORKERS, len(uploads))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(prepare_uploaded_photo, photos, uploads))
+            with transaction.atomic():
+                CarPhoto.objects.bulk_create(photos)
+                # bulk_create не вызывает сигналы - обновляем статистику сами
+                CarStats.apply_photos_delta(car.pk, len(photos))
+                transaction.on_commit(CarStats.invalidate_cache)
+                if primary_index is not None:
+                    # Новое основное фото и снятие флага с прежнего - одним запросом
+                    primary = photos[primary_index]
+                    CarPhoto.objects.filter(car=car).filter(
+                        Q(is_primary=True) | Q(pk=primary.pk)
+                    ).update(is_primary=Case(When(pk=primary.pk, then=Value(True)), default=Value(False)))
+                    primary.is_primary = True
+                else:
+                    # Первое фото становится основным, только если основного еще нет
+                    primary = photos[0]
+                    primary.is_primary = bool(
+                        CarPhoto.objects.filter(pk=primary.pk).exclude(
+                            Exists(CarPhoto.objects.filter(car=OuterRef('car'), is_primary=True))
+                        ).update(is_primary=True)
+                    )
+        except Exception:
+            # Файлы уже записаны в хранилище, а строк в базе нет - удаляем их
+            delete_prepared_photos(photos)
+            raise
+
+        output = CarPhotoSerializer(photos, many=True, context=self.get_serializer_context())
+        return Response(output.data, status=status.HTTP_201_CREATED)
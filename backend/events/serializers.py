@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from accounts.thumbnails import AVATAR_LIST_SIZE, get_avatar_url
 from .models import Event, EventRegistration
 
 
@@ -101,7 +102,7 @@ class EventRegistrationSerializer(serializers.ModelSerializer):
         """
         if obj.is_anonymous:
             return None
-        return obj.user.id
+        return obj.user_id
     
     def get_user_avatar(self, obj):
         """
@@ -110,16 +111,17 @@ class EventRegistrationSerializer(serializers.ModelSerializer):
         if obj.is_anonymous:
             return None
         if obj.user.avatar:
+            # Миниатюра для списка вместо оригинала
+            avatar_url = get_avatar_url(obj.user, AVATAR_LIST_SIZE)
             request = self.context.get('request')
             if request:
                 # Возвращаем относительный путь для прокси Vite
-                avatar_url = obj.user.avatar.url
                 if avatar_url.startswith('/media/'):
                     return avatar_url
                 elif avatar_url.startswith('/'):
                     return f'/media{avatar_url}'
                 else:
                     return f'/media/{avatar_url}'
-            return obj.user.avatar.url
+            return avatar_url
         return None
 
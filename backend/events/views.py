@@ -115,7 +115,8 @@ class EventViewSet(viewsets.ModelViewSet):
         Анонимные лайки показываются как "Аноним"
         """
         event = self.get_object()
-        likes = event.registrations.filter(is_attending=True).order_by('-created_at')
+        # Данные пользователей загружаются тем же запросом, что и лайки
+        likes = event.registrations.filter(is_attending=True).select_related('user').order_by('-created_at')
         
         serializer = EventRegistrationSerializer(likes, many=True, context={'request': request})
         return Response({
@@ -148,9 +149,9 @@ class EventRegistrationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_staff or user.is_superuser:
-            return EventRegistration.objects.all()
+            return EventRegistration.objects.select_related('user')
         else:
-            return EventRegistration.objects.filter(user=user)
+            return EventRegistration.objects.filter(user=user).select_related('user')
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -1,5 +1,7 @@
 from django.db import models
 from django.core.validators import MinLengthValidator
+from django.utils import timezone
+from tuning_studio.dirty_fields import DirtyFieldsMixin
 
 
 class ForumCategory(models.Model):
@@ -46,7 +48,7 @@ class ForumCategory(models.Model):
         return self.name
 
 
-class ForumTopic(models.Model):
+class ForumTopic(DirtyFieldsMixin, models.Model):
     """
     Темы обсуждений в форуме
     """
@@ -120,7 +122,7 @@ class ForumTopic(models.Model):
         return self.posts.order_by('-created_at').first()
 
 
-class ForumPost(models.Model):
+class ForumPost(DirtyFieldsMixin, models.Model):
     """
     Сообщения в темах форума
     """
@@ -171,12 +173,11 @@ class ForumPost(models.Model):
         return f"Сообщение от {self.author.username} в теме {self.topic.title}"
     
     def save(self, *args, **kwargs):
-        # Автоматически отмечает сообщение как отредактированное если изменился текст
-        if self.pk:
-            # Если объект уже существует, проверяем, изменилось ли содержание
-            old_instance = ForumPost.objects.get(pk=self.pk)
-            if old_instance.content != self.content:
-                self.is_edited = True
+        # Автоматически отмечает сообщение как отредактированное если изменился текст.
+        # Старое значение берется из загруженных полей, без запроса к базе
+        if not self._state.adding and self.is_dirty('content'):
+            self.is_edited = True
+            self.edited_at = timezone.now()
         super().save(*args, **kwargs)
 
 
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import ForumCategory, ForumTopic, ForumPost, ForumLike, ForumImage
-from accounts.serializers import UserSerializer
+from accounts.author_cards import AuthorCardField
 
 
 class ForumCategorySerializer(serializers.ModelSerializer):
@@ -19,7 +19,7 @@ class ForumLikeSerializer(serializers.ModelSerializer):
     """
     Сериализатор для лайков
     """
-    user = UserSerializer(read_only=True)
+    user = AuthorCardField(source='user_id')
     
     class Meta:
         model = ForumLike
@@ -52,7 +52,7 @@ class ForumPostSerializer(serializers.ModelSerializer):
     """
     Сериализатор для сообщений форума
     """
-    author = UserSerializer(read_only=True)
+    author = AuthorCardField(source='author_id')
     likes_count = serializers.IntegerField(source='likes.count', read_only=True)
     is_liked = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
@@ -80,7 +80,7 @@ class ForumPostSerializer(serializers.ModelSerializer):
 
 # Сериализатор для списка тем - упрощенная версия
 class ForumTopicListSerializer(serializers.ModelSerializer):
-    author = UserSerializer(read_only=True)
+    author = AuthorCardField(source='author_id')
     category = serializers.PrimaryKeyRelatedField(queryset=ForumCategory.objects.all(), required=True)
     category_detail = ForumCategorySerializer(source='category', read_only=True)
     posts_count = serializers.IntegerField(source='posts.count', read_only=True)
@@ -112,7 +112,7 @@ class ForumTopicDetailSerializer(serializers.ModelSerializer):
     """
     Сериализатор для детальной информации о теме
     """
-    author = UserSerializer(read_only=True)
+    author = AuthorCardField(source='author_id')
     category = serializers.PrimaryKeyRelatedField(queryset=ForumCategory.objects.all(), required=True)
     category_detail = ForumCategorySerializer(source='category', read_only=True)
     posts = ForumPostSerializer(many=True, read_only=True)
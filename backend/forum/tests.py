@@ -0,0 +1,69 @@
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from accounts.models import User
+from .models import ForumCategory, ForumTopic, ForumPost
+
+
+class ForumPostSaveTest(TestCase):
+    """
+    Сохранение сообщения через DirtyFieldsMixin: в UPDATE попадают только
+    измененные поля, а отметка "отредактировано" - только при смене текста
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('writer')
+        category = ForumCategory.objects.create(name='Проверка', slug='save-test')
+        topic = ForumTopic.objects.create(category=category, author=self.user, title='Тема', content='Текст')
+        self.post = ForumPost.objects.create(topic=topic, author=self.user, content='Первый вариант')
+
+    def save_and_capture(self, post):
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+
+    def test_unchanged_save_not_edited(self):
+        post = ForumPost.objects.get(pk=self.post.pk)
+        post.save()
+        post = ForumPost.objects.get(pk=self.post.pk)
+        self.assertFalse(post.is_edited)
+        self.assertIsNone(post.edited_at)
+
+    def test_content_change_marks_edited(self):
+        post = ForumPost.objects.get(pk=self.post.pk)
+        post.content = 'Второй вариант'
+        [update] = self.save_and_capture(post)
+        # Только измененные поля, без topic, author и created_at
+        self.assertIn('"content"', update)
+        self.assertIn('"is_edited"', update)
+        self.assertNotIn('"topic_id"', update)
+        self.assertNotIn('"created_at"', update)
+        post = ForumPost.objects.get(pk=self.post.pk)
+        self.assertTrue(post.is_edited)
+        self.assertIsNotNone(post.edited_at)
+
+    def test_same_content_not_edited(self):
+        post = ForumPost.objects.get(pk=self.post.pk)
+        post.content = 'Первый вариант'
+        post.save()
+        self.assertFalse(ForumPost.objects.get(pk=self.post.pk).is_edited)
+
+    def test_deferred_field_assignment_saved(self):
+        post = ForumPost.objects.only('id').get(pk=self.post.pk)
+        post.content = 'Из отложенного поля'
+        self.assertIn('content', post.get_dirty_fields())
+        post.save()
+        post = ForumPost.objects.get(pk=self.post.pk)
+        self.assertEqual(post.content, 'Из отложенного поля')
+        self.assertTrue(post.is_edited)
+
+    def test_clean_save_sends_signals(self):
+        received = []
+        handler = lambda sender, **kwargs: received.append(kwargs['update_fields'])  # noqa: E731
+        post_save.connect(handler, sender=ForumPost)
+        try:
+            ForumPost.objects.get(pk=self.post.pk).save()
+        finally:
+            post_save.disconnect(handler, sender=ForumPost)
+        self.assertEqual(received, [None])
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Count, Q
+from accounts.author_cards import AUTHOR_CARDS_CONTEXT_KEY, AuthorCardsMixin, load_author_cards
 from .models import ForumCategory, ForumTopic, ForumPost, ForumLike, ForumImage
 from .serializers import (
     ForumCategorySerializer, ForumTopicListSerializer, ForumTopicDetailSerializer,
@@ -24,7 +25,7 @@ class ForumCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['name', 'description']
 
 
-class ForumTopicViewSet(viewsets.ModelViewSet):
+class ForumTopicViewSet(AuthorCardsMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления темами форума
     """
@@ -40,7 +41,7 @@ class ForumTopicViewSet(viewsets.ModelViewSet):
         Возвращает список тем с дополнительной информацией
         """
         queryset = ForumTopic.objects.select_related(
-            'category', 'author'
+            'category'
         ).prefetch_related('posts', 'images').annotate(
             posts_count=Count('posts')
         )
@@ -63,6 +64,16 @@ class ForumTopicViewSet(viewsets.ModelViewSet):
             return ForumTopicDetailSerializer
         return ForumTopicListSerializer
     
+    def get_author_ids(self, instances):
+        """
+        Авторы тем, а при просмотре темы - еще и авторы всех сообщений
+        """
+        author_ids = [topic.author_id for topic in instances]
+        if self.action == 'retrieve':
+            for topic in instances:
+                author_ids.extend(post.author_id for post in topic.posts.all())
+        return author_ids
+    
     def get_serializer_context(self):
         """
         Добавляем request в контекст сериализатора для полных ссылок
@@ -82,7 +93,7 @@ class ForumTopicViewSet(viewsets.ModelViewSet):
         При обновлении темы проверяем, что пользователь является автором
         """
         topic = self.get_object()
-        if topic.author != self.request.user and not (self.request.user.is_staff or self.request.user.is_superuser):
+        if topic.author_id != self.request.user.id and not (self.request.user.is_staff or self.request.user.is_superuser):
             raise serializers.ValidationError('Вы можете редактировать только свои темы')
         serializer.save()
     
@@ -90,7 +101,7 @@ class ForumTopicViewSet(viewsets.ModelViewSet):
         """
         При удалении темы проверяем права
         """
-        if instance.author != self.request.user and not (self.request.user.is_staff or self.request.user.is_superuser):
+        if instance.author_id != self.request.user.id and not (self.request.user.is_staff or self.request.user.is_superuser):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Вы можете удалять только свои темы')
         instance.delete()
@@ -141,7 +152,7 @@ class ForumTopicViewSet(viewsets.ModelViewSet):
         return Response({'is_locked': topic.is_locked})
 
 
-class ForumPostViewSet(viewsets.ModelViewSet):
+class ForumPostViewSet(AuthorCardsMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления сообщениями в темах
     """
@@ -157,8 +168,8 @@ class ForumPostViewSet(viewsets.ModelViewSet):
         Возвращает сообщения с информацией о лайках и изображениях
         """
         return ForumPost.objects.select_related(
-            'topic', 'author'
-        ).prefetch_related('likes', 'likes__user', 'images').annotate(
+            'topic'
+        ).prefetch_related('likes', 'images').annotate(
             likes_count=Count('likes')
         )
     
@@ -184,7 +195,7 @@ class ForumPostViewSet(viewsets.ModelViewSet):
         При обновлении сообщения проверяем, что пользователь является автором
         """
         post = self.get_object()
-        if post.author != self.request.user and not (self.request.user.is_staff or self.request.user.is_superuser):
+        if post.author_id != self.request.user.id and not (self.request.user.is_staff or self.request.user.is_superuser):
             raise serializers.ValidationError('Вы можете редактировать только свои сообщения')
         serializer.save()
     
@@ -192,7 +203,7 @@ class ForumPostViewSet(viewsets.ModelViewSet):
         """
         При удалении сообщения проверяем права
         """
-        if instance.author != self.request.user and not (self.request.user.is_staff or self.request.user.is_superuser):
+        if instance.author_id != self.request.user.id and not (self.request.user.is_staff or self.request.user.is_superuser):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Вы можете удалять только свои сообщения')
         instance.delete()
@@ -221,8 +232,10 @@ class ForumPostViewSet(viewsets.ModelViewSet):
         Получить список пользователей, поставивших лайк
         """
         post = self.get_object()
-        likes = post.likes.select_related('user')
-        serializer = ForumLikeSerializer(likes, many=True)
+        likes = list(post.likes.all())
+        context = self.get_serializer_context()
+        context[AUTHOR_CARDS_CONTEXT_KEY] = load_author_cards([like.user_id for like in likes], request)
+        serializer = ForumLikeSerializer(likes, many=True, context=context)
         return Response(serializer.data)
 
 
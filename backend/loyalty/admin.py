@@ -1,14 +1,36 @@
 from django.contrib import admin
-from .models import BonusTransaction, PromoCode, Settings
+from .models import BonusTransaction, BonusBalance, PromoCode, Settings
 
 
 @admin.register(BonusTransaction)
 class BonusTransactionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'points', 'transaction_type', 'booking', 'created_at']
+    list_display = ['user', 'points', 'transaction_type', 'order', 'created_at']
     list_filter = ['transaction_type', 'created_at']
     search_fields = ['user__username', 'description']
     date_hierarchy = 'created_at'
     readonly_fields = ['created_at']
+    raw_id_fields = ['user', 'order']
+    
+    # Журнал только дополняется - исправления делаются новой записью
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BonusBalance)
+class BonusBalanceAdmin(admin.ModelAdmin):
+    list_display = ['user', 'points', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'points', 'updated_at']
+    
+    # Остаток меняется только через журнал транзакций
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(PromoCode)
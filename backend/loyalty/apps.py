@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class LoyaltyConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'loyalty'
+    
+    def ready(self):
+        # Подключаем обработчики сигналов и системные проверки
+        from . import checks, signals  # noqa: F401
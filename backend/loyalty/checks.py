@@ -0,0 +1,21 @@
+# Системные проверки бонусной программы
+from django.core.checks import Tags, Warning, register
+from tuning_studio.caches import LOCAL_CACHE_BACKENDS, get_cache_backend
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Настройки (Settings.get_settings) и промокоды (PromoCode.get_cached)
+    сбрасываются во всех процессах через общий кэш. С кэшем в памяти
+    процесса другие процессы изменений не увидят.
+    """
+    backend = get_cache_backend()
+    if backend in LOCAL_CACHE_BACKENDS:
+        return [Warning(
+            f'Кэш по умолчанию ({backend}) не общий для процессов: изменения настроек '
+            'бонусной программы и промокодов не дойдут до других процессов.',
+            hint='Укажите CACHE_BACKEND с файловым кэшем, Redis или Memcached.',
+            id='loyalty.W001',
+        )]
+    return []
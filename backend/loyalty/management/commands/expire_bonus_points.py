@@ -0,0 +1,203 @@
+"""
+Management команда для списания сгоревших бонусных баллов
+
+Находит начисления (earned) старше срока жизни баллов и пишет для них
+записи "Истекло" (expired). Работает порциями по диапазонам id начислений:
+каждая порция - один SQL-запрос INSERT ... SELECT, который в том же
+операторе уменьшает остатки в BonusBalance.
+
+Сгорает не больше, чем осталось у пользователя: если часть баллов уже
+потрачена, запись "Истекло" будет на меньшую сумму (или на 0).
+Ручные начисления администратора (manual) не сгорают: они вычитаются
+из остатка, который может сгореть, так же как свежие начисления.
+
+Остатки пользователей порции блокируются (SELECT ... FOR UPDATE) до
+расчета, поэтому списание баллов во время работы команды ждет окончания
+порции и не может увести остаток в минус.
+
+Команду можно прервать и запустить снова - уже обработанные начисления
+пропускаются (у каждого начисления не больше одной записи "Истекло").
+
+Использование:
+    python manage.py expire_bonus_points [--days N] [--batch-size N] [--start-id N] [--dry-run]
+
+Примеры:
+    python manage.py expire_bonus_points
+    python manage.py expire_bonus_points --days 180 --batch-size 50000
+"""
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from loyalty.models import BonusTransaction, BonusBalance, Settings
+
+
+# Блокировка остатков пользователей порции - в порядке user_id,
+# чтобы параллельные запуски не блокировали друг друга взаимно
+LOCK_BALANCES_SQL = """
+SELECT b.user_id FROM {balance} b
+WHERE b.user_id IN (
+    SELECT t.user_id FROM {ledger} t
+    WHERE t.transaction_type = 'earned'
+      AND t.created_at < %(cutoff)s
+      AND t.id > %(start_id)s
+      AND t.id <= %(end_id)s
+)
+ORDER BY b.user_id
+FOR UPDATE
+"""
+
+# Одна порция: вставляем записи "Истекло" для начислений с id в (start, end]
+# и сразу вычитаем вставленные суммы из остатков пользователей.
+# Свежие начисления и ручные начисления считаются непотраченными (списание
+# идет со старых баллов), поэтому сгореть может только остаток сверх них.
+# Окно running_total распределяет этот остаток между старыми начислениями
+# по порядку, чтобы в сумме не сгорело больше остатка.
+EXPIRE_CHUNK_SQL = """
+WITH candidates AS (
+    SELECT
+        t.id,
+        t.user_id,
+        t.points,
+        GREATEST(COALESCE(b.points, 0) - COALESCE((
+            SELECT SUM(f.points) FROM {ledger} f
+            WHERE f.user_id = t.user_id
+              AND (
+                  (f.transaction_type = 'earned' AND f.created_at >= %(cutoff)s)
+                  OR (f.transaction_type = 'manual' AND f.points > 0)
+              )
+        ), 0), 0) AS balance,
+        SUM(t.points) OVER (PARTITION BY t.user_id ORDER BY t.created_at, t.id) AS running_total
+    FROM {ledger} t
+    LEFT JOIN {balance} b ON b.user_id = t.user_id
+    WHERE t.transaction_type = 'earned'
+      AND t.created_at < %(cutoff)s
+      AND t.id > %(start_id)s
+      AND t.id <= %(end_id)s
+      AND NOT EXISTS (SELECT 1 FROM {ledger} e WHERE e.source_id = t.id)
+),
+inserted AS (
+    INSERT INTO {ledger} (user_id, source_id, points, transaction_type, description, created_at)
+    SELECT
+        user_id,
+        id,
+        -GREATEST(0, LEAST(points, balance - (running_total - points))),
+        'expired',
+        %(description)s,
+        %(now)s
+    FROM candidates
+    RETURNING user_id, points
+),
+totals AS (
+    SELECT user_id, SUM(points) AS points, COUNT(*) AS entries
+    FROM inserted
+    GROUP BY user_id
+),
+updated AS (
+    UPDATE {balance} b
+    SET points = b.points + totals.points, updated_at = %(now)s
+    FROM totals
+    WHERE b.user_id = totals.user_id AND totals.points <> 0
+    RETURNING b.user_id
+)
+SELECT
+    COALESCE(SUM(totals.entries), 0),
+    COALESCE(-SUM(totals.points), 0),
+    (SELECT COUNT(*) FROM updated)
+FROM totals
+"""
+
+
+class Command(BaseCommand):
+    help = 'Списывает сгоревшие бонусные баллы пакетными INSERT ... SELECT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Срок жизни баллов в днях (по умолчанию: из настроек системы)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Размер диапазона id начислений на одну порцию (по умолчанию: 10000)'
+        )
+        parser.add_argument(
+            '--start-id',
+            type=int,
+            default=0,
+            help='Продолжить с начислений с id больше указанного'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать начисления к списанию, ничего не записывая'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] or Settings.get_settings().bonus_points_lifetime_days
+        batch_size = options['batch_size']
+        now = timezone.now()
+        cutoff = now - timedelta(days=days)
+
+        pending = BonusTransaction.objects.filter(
+            transaction_type='earned',
+            created_at__lt=cutoff,
+            id__gt=options['start_id'],
+            expirations__isnull=True,
+        )
+        bounds = pending.aggregate(first_id=Min('id'), last_id=Max('id'))
+        if bounds['first_id'] is None:
+            self.stdout.write(self.style.SUCCESS('Нет баллов к списанию'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Пробный запуск - данные не изменяются'))
+            self.stdout.write(f'Начислений к списанию: {pending.count()} (срок жизни {days} дн.)')
+            return
+
+        tables = {
+            'ledger': connection.ops.quote_name(BonusTransaction._meta.db_table),
+            'balance': connection.ops.quote_name(BonusBalance._meta.db_table),
+        }
+        lock_sql = LOCK_BALANCES_SQL.format(**tables)
+        sql = EXPIRE_CHUNK_SQL.format(**tables)
+        description = f'Баллы сгорели (срок жизни {days} дн.)'
+
+        started = time.monotonic()
+        total_entries = 0
+        total_points = 0
+        total_users = 0
+        start_id = bounds['first_id'] - 1
+        while start_id < bounds['last_id']:
+            end_id = start_id + batch_size
+            params = {
+                'cutoff': cutoff,
+                'start_id': start_id,
+                'end_id': end_id,
+                'description': description,
+                'now': now,
+            }
+            # Запись в журнал и изменение остатков - один оператор. Он выполняется
+            # после блокировки остатков и видит их актуальные значения
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(lock_sql, params)
+                cursor.execute(sql, params)
+                entries, points, users = cursor.fetchone()
+            total_entries += entries
+            total_points += points
+            total_users += users
+            self.stdout.write(
+                f'Начисления #{start_id + 1}-#{end_id}: записей {entries}, списано {points} баллов'
+            )
+            start_id = end_id
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Создано записей "Истекло": {total_entries}'))
+        self.stdout.write(self.style.SUCCESS(f'Списано баллов: {total_points} (изменено остатков: {total_users})'))
+        self.stdout.write(f'Последний обработанный id: {start_id}')
+        self.stdout.write(f'Время выполнения: {elapsed:.2f} с')
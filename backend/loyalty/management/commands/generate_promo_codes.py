@@ -0,0 +1,183 @@
+"""
+Management команда для массовой генерации промокодов
+
+Генерирует N уникальных промокодов по шаблону: каждый символ X в шаблоне
+заменяется случайной буквой или цифрой, остальные символы остаются как есть.
+Уникальность проверяется по множеству уже сгенерированных кодов и по базе
+(порциями), коды вставляются пакетами через bulk_create и сразу пишутся в CSV.
+
+Использование:
+    python manage.py generate_promo_codes COUNT [--pattern P] [--discount-percent N]
+        [--discount-amount N] [--min-order-amount N] [--max-uses N] [--valid-days N]
+        [--batch-size N] [--output FILE]
+
+Примеры:
+    python manage.py generate_promo_codes 100000 --discount-percent 10 --output giveaway.csv
+    python manage.py generate_promo_codes 500 --pattern SUMMER-XXXX-XXXX --discount-amount 500
+"""
+import csv
+import secrets
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Upper
+from django.utils import timezone
+from loyalty.models import PromoCode
+
+
+# Без похожих друг на друга символов (0/O, 1/I/L), чтобы коды было проще вводить вручную
+CODE_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+PLACEHOLDER = 'X'
+
+
+class Command(BaseCommand):
+    help = 'Генерирует пачку уникальных промокодов и выгружает их в CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'count',
+            type=int,
+            help='Сколько промокодов сгенерировать'
+        )
+        parser.add_argument(
+            '--pattern',
+            type=str,
+            default='PROMO-XXXXXXXX',
+            help='Шаблон кода, X заменяется случайным символом (по умолчанию: PROMO-XXXXXXXX)'
+        )
+        parser.add_argument(
+            '--discount-percent',
+            type=int,
+            default=0,
+            help='Скидка в процентах'
+        )
+        parser.add_argument(
+            '--discount-amount',
+            type=Decimal,
+            default=Decimal('0'),
+            help='Фиксированная скидка в рублях'
+        )
+        parser.add_argument(
+            '--min-order-amount',
+            type=Decimal,
+            default=Decimal('0'),
+            help='Минимальная сумма заказа'
+        )
+        parser.add_argument(
+            '--max-uses',
+            type=int,
+            default=1,
+            help='Максимум использований каждого кода (по умолчанию: 1)'
+        )
+        parser.add_argument(
+            '--valid-days',
+            type=int,
+            default=30,
+            help='Сколько дней коды действуют, начиная с текущего момента (по умолчанию: 30)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько кодов вставлять за один запрос (по умолчанию: 5000)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='promo_codes.csv',
+            help='Файл, в который будут выгружены коды (по умолчанию: promo_codes.csv)'
+        )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        pattern = options['pattern'].upper()
+        batch_size = options['batch_size']
+
+        if count < 1:
+            raise CommandError('Количество кодов должно быть больше нуля')
+        if len(pattern) > PromoCode._meta.get_field('code').max_length:
+            raise CommandError('Шаблон длиннее максимальной длины промокода')
+        if not options['discount_percent'] and not options['discount_amount']:
+            raise CommandError('Укажите --discount-percent или --discount-amount')
+
+        # Если вариантов мало, случайные коды начнут постоянно совпадать
+        combinations = len(CODE_ALPHABET) ** pattern.count(PLACEHOLDER)
+        if count > combinations // 2:
+            raise CommandError(
+                f'Шаблон "{pattern}" дает только {combinations} вариантов - добавьте символы {PLACEHOLDER}'
+            )
+
+        now = timezone.now()
+        defaults = {
+            'discount_percent': options['discount_percent'],
+            'discount_amount': options['discount_amount'],
+            'min_order_amount': options['min_order_amount'],
+            'max_uses': options['max_uses'],
+            'valid_from': now,
+            'valid_until': now + timedelta(days=options['valid_days']),
+            'is_active': True,
+        }
+
+        started = time.monotonic()
+        seen = set()
+        created = 0
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            writer = csv.writer(output)
+            writer.writerow(['code', 'valid_until'])
+            while created < count:
+                batch = self._generate_batch(pattern, min(batch_size, count - created), seen)
+                PromoCode.objects.bulk_create(
+                    [PromoCode(code=code, **defaults) for code in batch],
+                    batch_size=batch_size,
+                    ignore_conflicts=True
+                )
+                # Коды, отброшенные из-за конфликта (их успел создать кто-то другой),
+                # не выгружаем: берем только строки, созданные этим запуском
+                inserted = list(
+                    PromoCode.objects.filter(code__in=batch, valid_from=defaults['valid_from'])
+                    .order_by('code').values_list('code', flat=True)
+                )
+                # bulk_create не вызывает save() - сбрасываем закэшированное
+                # "не найдено" для новых кодов сами
+                PromoCode.invalidate_cache(*inserted)
+                valid_until = defaults['valid_until'].isoformat()
+                writer.writerows([code, valid_until] for code in inserted)
+                created += len(inserted)
+                self.stdout.write(f'Создано {created} из {count}')
+
+        elapsed = time.monotonic() - started
+        rate = created / elapsed if elapsed else created
+        self.stdout.write(self.style.SUCCESS(f'Создано промокодов: {created}'))
+        self.stdout.write(self.style.SUCCESS(f'Коды выгружены в {options["output"]}'))
+        self.stdout.write(f'Время выполнения: {elapsed:.2f} с ({rate:.0f} кодов/с)')
+
+    def _generate_batch(self, pattern, size, seen):
+        """
+        Генерирует size новых кодов, которых нет ни среди уже выданных
+        этой командой (seen), ни в базе. Проверка по базе идет одним
+        запросом на каждую порцию кандидатов.
+        """
+        batch = []
+        while len(batch) < size:
+            candidates = set()
+            while len(candidates) < size - len(batch):
+                code = self._make_code(pattern)
+                if code not in seen:
+                    candidates.add(code)
+
+            existing = set(
+                PromoCode.objects.annotate(code_upper=Upper('code'))
+                .filter(code_upper__in=candidates)
+                .values_list('code_upper', flat=True)
+            )
+            seen.update(candidates)
+            batch.extend(candidates - existing)
+        return batch
+
+    @staticmethod
+    def _make_code(pattern):
+        return ''.join(
+            secrets.choice(CODE_ALPHABET) if char == PLACEHOLDER else char
+            for char in pattern
+        )
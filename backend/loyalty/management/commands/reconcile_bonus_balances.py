@@ -0,0 +1,101 @@
+"""
+Management команда для сверки бонусных балансов с журналом
+
+Пересчитывает сумму BonusTransaction по пользователям порциями
+и сравнивает ее с материализованным остатком в BonusBalance.
+
+Использование:
+    python manage.py reconcile_bonus_balances [--batch-size N] [--fix]
+
+Примеры:
+    python manage.py reconcile_bonus_balances
+    python manage.py reconcile_bonus_balances --batch-size 5000 --fix
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from loyalty.models import BonusTransaction, BonusBalance
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Сверяет остатки BonusBalance с суммой журнала бонусных транзакций'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько пользователей проверять за один проход (по умолчанию: 1000)'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Исправить расхождения, записав в остаток сумму журнала'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fix = options['fix']
+
+        checked = 0
+        drifted = 0
+        total_drift = 0
+        last_user_id = 0
+
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_user_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            last_user_id = user_ids[-1]
+            checked += len(user_ids)
+
+            with transaction.atomic():
+                balances = BonusBalance.objects.filter(user_id__in=user_ids)
+                if fix:
+                    # Блокируем остатки порции, чтобы новые транзакции не изменили их во время исправления.
+                    # В режиме отчета не блокируем - сверка не должна мешать начислениям и списаниям
+                    # (расхождение из-за параллельной транзакции пропадет при повторном запуске)
+                    balances = balances.select_for_update()
+                balances = {balance.user_id: balance for balance in balances}
+                ledger = dict(
+                    BonusTransaction.objects.filter(user_id__in=user_ids)
+                    .order_by().values('user_id').annotate(total=Sum('points'))
+                    .values_list('user_id', 'total')
+                )
+
+                now = timezone.now()
+                to_update = []
+                to_create = []
+                for user_id in user_ids:
+                    expected = ledger.get(user_id) or 0
+                    balance = balances.get(user_id)
+                    actual = balance.points if balance else 0
+                    if expected == actual:
+                        continue
+                    drifted += 1
+                    total_drift += expected - actual
+                    self.stdout.write(self.style.WARNING(
+                        f'Пользователь #{user_id}: в журнале {expected}, в остатке {actual}'
+                    ))
+                    if balance:
+                        balance.points = expected
+                        # bulk_update не заполняет поля auto_now
+                        balance.updated_at = now
+                        to_update.append(balance)
+                    else:
+                        to_create.append(BonusBalance(user_id=user_id, points=expected))
+
+                if fix:
+                    BonusBalance.objects.bulk_update(to_update, ['points', 'updated_at'])
+                    BonusBalance.objects.bulk_create(to_create)
+
+        self.stdout.write(self.style.SUCCESS(f'Проверено пользователей: {checked}'))
+        self.stdout.write(self.style.SUCCESS(f'Расхождений: {drifted} (суммарно {total_drift} баллов)'))
+        if drifted and fix:
+            self.stdout.write(self.style.SUCCESS('Остатки исправлены по журналу'))
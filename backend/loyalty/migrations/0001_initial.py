@@ -12,7 +12,6 @@ class Migration(migrations.Migration):
 
     dependencies = [
         migrations.swappable_dependency(settings.AUTH_USER_MODEL),
-        ('bookings', '0001_initial'),
     ]
 
     operations = [
@@ -62,7 +61,6 @@ class Migration(migrations.Migration):
                 ('transaction_type', models.CharField(choices=[('earned', 'Начислено'), ('spent', 'Потрачено'), ('expired', 'Истекло'), ('manual', 'Ручное начисление/списание')], max_length=20, verbose_name='Тип транзакции')),
                 ('description', models.TextField(blank=True, null=True, verbose_name='Описание')),
                 ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
-                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bonus_transactions', to='bookings.booking', verbose_name='Заказ')),
                 ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bonus_transactions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
             ],
             options={
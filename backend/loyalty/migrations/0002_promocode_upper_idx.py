@@ -0,0 +1,17 @@
+# Generated manually
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='promocode',
+            index=models.Index(django.db.models.functions.text.Upper('code'), name='promo_code_upper_idx'),
+        ),
+    ]
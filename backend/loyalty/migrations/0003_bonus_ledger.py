@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0007_order_promo_code'),
+        ('loyalty', '0002_promocode_upper_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BonusBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField(default=0, verbose_name='Баланс баллов')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Баланс бонусов',
+                'verbose_name_plural': 'Балансы бонусов',
+            },
+        ),
+        migrations.AddField(
+            model_name='bonustransaction',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bonus_transactions', to='shop.order', verbose_name='Заказ'),
+        ),
+        migrations.AddIndex(
+            model_name='bonustransaction',
+            index=models.Index(fields=['user', '-created_at'], name='bonus_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bonustransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('order__isnull', False)), fields=('order', 'transaction_type'), name='bonus_order_type_uniq'),
+        ),
+        migrations.AddField(
+            model_name='bonusbalance',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='bonus_balance', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+    ]
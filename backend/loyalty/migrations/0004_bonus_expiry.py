@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:40
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0003_bonus_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bonustransaction',
+            name='source',
+            field=models.ForeignKey(blank=True, help_text='Для записей "Истекло" - начисление, баллы которого сгорели', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expirations', to='loyalty.bonustransaction', verbose_name='Исходное начисление'),
+        ),
+        migrations.AddField(
+            model_name='settings',
+            name='bonus_points_lifetime_days',
+            field=models.IntegerField(default=365, help_text='Через сколько дней начисленные баллы сгорают', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Срок жизни баллов (дней)'),
+        ),
+        migrations.AddIndex(
+            model_name='bonustransaction',
+            index=models.Index(fields=['transaction_type', 'created_at'], name='bonus_type_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bonustransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('source__isnull', False)), fields=('source',), name='bonus_source_uniq'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:10
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+def check_duplicate_codes(apps, schema_editor):
+    # Коды, различающиеся только регистром, нужно переименовать вручную до миграции
+    PromoCode = apps.get_model('loyalty', 'PromoCode')
+    duplicates = list(
+        PromoCode.objects.annotate(
+            code_upper=django.db.models.functions.text.Upper('code')
+        ).values('code_upper').annotate(
+            count=models.Count('id')
+        ).filter(count__gt=1).values_list('code_upper', flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Промокоды различаются только регистром: ' + ', '.join(duplicates)
+            + '. Переименуйте или удалите лишние коды и повторите миграцию.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0004_bonus_expiry'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_codes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='promocode',
+            name='promo_code_upper_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='promocode',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('code'), name='promo_code_upper_uniq', violation_error_message='Промокод с таким кодом уже существует'),
+        ),
+    ]
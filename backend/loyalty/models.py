@@ -1,11 +1,31 @@
-from django.db import models
+import copy
+import uuid
+from decimal import Decimal
+from django.db import models, transaction, IntegrityError
+from django.db.models.functions import Upper
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from tuning_studio.dirty_fields import DirtyFieldsMixin
+
+
+# Время жизни кэша промокодов (секунды): найденные и ненайденные коды
+PROMO_CODE_CACHE_TIMEOUT = 60
+PROMO_CODE_NOT_FOUND_CACHE_TIMEOUT = 15
+PROMO_CODE_NOT_FOUND = 'not-found'
+
+# Версия настроек в общем кэше: по ней процессы узнают, что их локальная копия устарела
+SETTINGS_VERSION_CACHE_KEY = 'loyalty_settings:version'
 
 
 class BonusTransaction(models.Model):
     """
-    Транзакции бонусных баллов
+    Транзакции бонусных баллов.
+    
+    Журнал только дополняется: записи не изменяются после создания,
+    а каждая новая запись в той же транзакции БД прибавляется
+    к остатку пользователя в BonusBalance.
     """
     TRANSACTION_TYPE_CHOICES = [
         ('earned', 'Начислено'),
@@ -20,14 +40,23 @@ class BonusTransaction(models.Model):
         related_name='bonus_transactions',
         verbose_name='Пользователь'
     )
-    # booking = models.ForeignKey(
-    #     'bookings.Booking',
-    #     on_delete=models.SET_NULL,
-    #     blank=True,
-    #     null=True,
-    #     related_name='bonus_transactions',
-    #     verbose_name='Заказ'
-    # )
+    order = models.ForeignKey(
+        'shop.Order',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='bonus_transactions',
+        verbose_name='Заказ'
+    )
+    source = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='expirations',
+        verbose_name='Исходное начисление',
+        help_text='Для записей "Истекло" - начисление, баллы которого сгорели'
+    )
     points = models.IntegerField(
         verbose_name='Количество баллов'
     )
@@ -50,12 +79,110 @@ class BonusTransaction(models.Model):
         verbose_name = 'Транзакция бонусов'
         verbose_name_plural = 'Транзакции бонусов'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='bonus_user_created_idx'),
+            models.Index(fields=['transaction_type', 'created_at'], name='bonus_type_created_idx'),
+        ]
+        constraints = [
+            # За один заказ баллы начисляются только один раз
+            models.UniqueConstraint(
+                fields=['order', 'transaction_type'],
+                condition=models.Q(order__isnull=False),
+                name='bonus_order_type_uniq'
+            ),
+            # Каждое начисление сгорает не более одного раза
+            models.UniqueConstraint(
+                fields=['source'],
+                condition=models.Q(source__isnull=False),
+                name='bonus_source_uniq'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.get_transaction_type_display()} {self.points} баллов"
+    
+    def save(self, *args, **kwargs):
+        """
+        Создание записи сразу меняет остаток пользователя, изменение записей запрещено
+        """
+        if not self._state.adding:
+            raise ValueError('Транзакции бонусов нельзя изменять, создайте корректирующую запись')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            BonusBalance.add_points(self.user_id, self.points)
+    
+    @classmethod
+    def award_for_order(cls, order):
+        """
+        Начислить баллы за доставленный заказ (повторно не начисляется)
+        """
+        if order.status != 'delivered' or cls.objects.filter(order=order, transaction_type='earned').exists():
+            return None
+        settings = Settings.get_settings()
+        points = int(Decimal(str(order.total_price)) * settings.bonus_points_per_rub)
+        if points <= 0:
+            return None
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    user_id=order.user_id,
+                    order=order,
+                    points=points,
+                    transaction_type='earned',
+                    description=f'Начисление за заказ #{order.pk}'
+                )
+        except IntegrityError:
+            # Параллельный запрос уже начислил баллы за этот заказ
+            return None
 
 
-class PromoCode(models.Model):
+class BonusBalance(models.Model):
+    """
+    Текущий остаток бонусных баллов пользователя.
+    
+    Материализованная сумма журнала BonusTransaction, чтобы не суммировать
+    весь журнал при каждом запросе. Сверяется командой reconcile_bonus_balances.
+    """
+    user = models.OneToOneField(
+        'accounts.User',
+        on_delete=models.CASCADE,
+        related_name='bonus_balance',
+        verbose_name='Пользователь'
+    )
+    points = models.IntegerField(
+        default=0,
+        verbose_name='Баланс баллов'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+    
+    class Meta:
+        verbose_name = 'Баланс бонусов'
+        verbose_name_plural = 'Балансы бонусов'
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.points} баллов"
+    
+    @classmethod
+    def add_points(cls, user_id, points):
+        """
+        Атомарно прибавить баллы к остатку (F-выражение, без чтения в Python)
+        """
+        now = timezone.now()
+        updated = cls.objects.filter(user_id=user_id).update(points=models.F('points') + points, updated_at=now)
+        if not updated:
+            balance, created = cls.objects.get_or_create(user_id=user_id, defaults={'points': points})
+            if not created:
+                cls.objects.filter(user_id=user_id).update(points=models.F('points') + points, updated_at=now)
+    
+    @classmethod
+    def get_points(cls, user):
+        return cls.objects.filter(user=user).values_list('points', flat=True).first() or 0
+
+
+class PromoCode(DirtyFieldsMixin, models.Model):
     """
     Промокоды
     """
@@ -113,10 +240,82 @@ class PromoCode(models.Model):
         verbose_name = 'Промокод'
         verbose_name_plural = 'Промокоды'
         ordering = ['-created_at']
+        constraints = [
+            # Коды, различающиеся только регистром, недопустимы: SALE и sale -
+            # один и тот же код. Индекс ограничения используется для поиска
+            # без учета регистра: WHERE UPPER(code) = 'SALE'
+            models.UniqueConstraint(
+                Upper('code'),
+                name='promo_code_upper_uniq',
+                violation_error_message='Промокод с таким кодом уже существует',
+            ),
+        ]
     
     def __str__(self):
         return self.code
     
+    def save(self, *args, **kwargs):
+        # При переименовании сбрасываем и прежний код - иначе он продолжит
+        # действовать из кэша. Снимок полей обновляется при сохранении,
+        # поэтому прежний код запоминаем заранее
+        previous_code = self.get_loaded_value('code', self.code)
+        super().save(*args, **kwargs)
+        # Сбрасываем кэш после коммита: иначе параллельный запрос успеет
+        # снова положить в кэш старую строку до окончания транзакции
+        codes = {self.code, previous_code}
+        transaction.on_commit(lambda: PromoCode.invalidate_cache(*codes))
+    
+    def delete(self, *args, **kwargs):
+        codes = {self.code, self.get_loaded_value('code', self.code)}
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(lambda: PromoCode.invalidate_cache(*codes))
+        return result
+    
+    @staticmethod
+    def normalize_code(code):
+        # Промокоды вводятся без учета регистра и пробелов по краям
+        return (code or '').strip().upper()
+    
+    @classmethod
+    def cache_key(cls, code):
+        return f'promo_code:{cls.normalize_code(code)}'
+    
+    @classmethod
+    def invalidate_cache(cls, *codes):
+        cache.delete_many([cls.cache_key(code) for code in codes])
+    
+    @classmethod
+    def lookup(cls, code):
+        """
+        Найти промокод в базе без учета регистра (использует уникальный индекс по UPPER(code))
+        """
+        return cls.objects.annotate(code_upper=Upper('code')).filter(
+            code_upper=cls.normalize_code(code)
+        ).first()
+    
+    @classmethod
+    def get_cached(cls, code):
+        """
+        Получить промокод через кэш.
+        
+        Кэшируются и найденные коды, и отсутствующие, чтобы серия проверок
+        при вводе кода на странице оформления не ходила в базу.
+        Возвращает несохраняемую копию промокода или None.
+        """
+        key = cls.cache_key(code)
+        data = cache.get(key)
+        if data is None:
+            promo_code = cls.lookup(code)
+            if promo_code is None:
+                cache.set(key, PROMO_CODE_NOT_FOUND, PROMO_CODE_NOT_FOUND_CACHE_TIMEOUT)
+                return None
+            data = {field.attname: getattr(promo_code, field.attname) for field in cls._meta.concrete_fields}
+            cache.set(key, data, PROMO_CODE_CACHE_TIMEOUT)
+            return promo_code
+        if data == PROMO_CODE_NOT_FOUND:
+            return None
+        return cls(**data)
+    
     def is_valid(self):
         """
         Проверка валидности промокода
@@ -130,13 +329,10 @@ class PromoCode(models.Model):
             return False
         return True
     
-    def apply_discount(self, amount):
+    def calculate_discounted_amount(self, amount):
         """
-        Применить скидку к сумме заказа
+        Сумма заказа после скидки без проверки срока действия и лимита использований
         """
-        if not self.is_valid():
-            return amount
-        
         if amount < self.min_order_amount:
             return amount
         
@@ -147,6 +343,56 @@ class PromoCode(models.Model):
             return max(0, amount - self.discount_amount)
         
         return amount
+    
+    def apply_discount(self, amount):
+        """
+        Применить скидку к сумме заказа
+        """
+        if not self.is_valid():
+            return amount
+        return self.calculate_discounted_amount(amount)
+    
+    @classmethod
+    def redeem(cls, code, order):
+        """
+        Погасить промокод для заказа.
+        
+        Счетчик использований увеличивается условным UPDATE, который
+        срабатывает только пока used_count < max_uses и код действует,
+        поэтому при параллельных заказах лимит не может быть превышен.
+        Скидка применяется к заказу в той же транзакции: если сохранить
+        заказ не удалось, использование кода тоже откатывается.
+        """
+        promo_code = cls.lookup(code)
+        if promo_code is None:
+            raise ValidationError('Промокод не найден')
+        
+        if order.total_price < promo_code.min_order_amount:
+            raise ValidationError(
+                f'Минимальная сумма заказа для этого промокода: {promo_code.min_order_amount} руб.'
+            )
+        
+        with transaction.atomic():
+            now = timezone.now()
+            updated = cls.objects.filter(
+                pk=promo_code.pk,
+                is_active=True,
+                used_count__lt=models.F('max_uses'),
+                valid_from__lte=now,
+                valid_until__gte=now,
+            ).update(used_count=models.F('used_count') + 1)
+            if not updated:
+                raise ValidationError('Промокод недействителен')
+            # Счетчик использований изменился - сбрасываем кэш после коммита
+            transaction.on_commit(lambda: cls.invalidate_cache(promo_code.code))
+            
+            discounted_amount = promo_code.calculate_discounted_amount(order.total_price)
+            order.promo_code = promo_code
+            order.discount_amount = order.total_price - discounted_amount
+            order.total_price = discounted_amount
+            order.save(update_fields=['promo_code', 'discount_amount', 'total_price', 'updated_at'])
+        
+        return promo_code
 
 
 class Settings(models.Model):
@@ -167,6 +413,12 @@ class Settings(models.Model):
         help_text='Сколько рублей за 1 балл (для расчета скидки)',
         verbose_name='Рублей за балл'
     )
+    bonus_points_lifetime_days = models.IntegerField(
+        default=365,
+        validators=[MinValueValidator(1)],
+        help_text='Через сколько дней начисленные баллы сгорают',
+        verbose_name='Срок жизни баллов (дней)'
+    )
     booking_advance_days = models.IntegerField(
         default=30,
         help_text='На сколько дней вперед можно бронировать',
@@ -196,18 +448,52 @@ class Settings(models.Model):
     def __str__(self):
         return 'Настройки системы'
     
+    # Локальная для процесса копия настроек: (версия, экземпляр)
+    _cached = (None, None)
+    
     def save(self, *args, **kwargs):
         """
         Гарантируем, что будет только одна запись настроек
         """
         self.pk = 1
         super().save(*args, **kwargs)
+        transaction.on_commit(Settings.invalidate_cache)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(Settings.invalidate_cache)
+        return result
+    
+    @classmethod
+    def invalidate_cache(cls):
+        """
+        Сбросить копии настроек во всех процессах: меняем версию в общем кэше
+        """
+        cls._cached = (None, None)
+        cache.set(SETTINGS_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
     
     @classmethod
     def get_settings(cls):
         """
-        Получить настройки (создать, если их нет)
+        Получить настройки (создать, если их нет).
+        Экземпляр хранится в памяти процесса и перечитывается из базы
+        только после смены версии в общем кэше. Кэш должен быть общим для
+        процессов (файловый, Redis, Memcached) - см. loyalty.checks.
         """
-        settings, created = cls.objects.get_or_create(pk=1)
-        return settings
+        version = cache.get(SETTINGS_VERSION_CACHE_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            # add не перезапишет версию, выставленную другим процессом
+            if not cache.add(SETTINGS_VERSION_CACHE_KEY, version, None):
+                version = cache.get(SETTINGS_VERSION_CACHE_KEY)
+
+        cached_version, settings = cls._cached
+        if settings is None or cached_version != version:
+            settings, created = cls.objects.get_or_create(pk=1)
+            if created:
+                # Перечитываем, чтобы поля были приведены к типам базы (Decimal вместо float)
+                settings.refresh_from_db()
+            cls._cached = (version, settings)
+        # Отдаем копию, чтобы изменения у вызывающего кода не попали в общий экземпляр
+        return copy.copy(settings)
 
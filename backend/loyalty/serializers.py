@@ -1,18 +1,15 @@
 from rest_framework import serializers
 from .models import BonusTransaction, PromoCode, Settings
-from bookings.serializers import BookingSerializer
 
 
 class BonusTransactionSerializer(serializers.ModelSerializer):
-    booking = BookingSerializer(read_only=True)
-    
     class Meta:
         model = BonusTransaction
         fields = [
-            'id', 'user', 'booking', 'points', 'transaction_type',
+            'id', 'user', 'order', 'points', 'transaction_type',
             'description', 'created_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at']
+        read_only_fields = ['id', 'user', 'order', 'created_at']
 
 
 class PromoCodeSerializer(serializers.ModelSerializer):
@@ -34,9 +31,8 @@ class PromoCodeValidateSerializer(serializers.Serializer):
         code = attrs.get('code')
         order_amount = attrs.get('order_amount')
         
-        try:
-            promo_code = PromoCode.objects.get(code=code)
-        except PromoCode.DoesNotExist:
+        promo_code = PromoCode.get_cached(code)
+        if promo_code is None:
             raise serializers.ValidationError('Промокод не найден')
         
         if not promo_code.is_valid():
@@ -55,7 +51,7 @@ class SettingsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Settings
         fields = [
-            'bonus_points_per_rub', 'bonus_points_to_rub',
+            'bonus_points_per_rub', 'bonus_points_to_rub', 'bonus_points_lifetime_days',
             'booking_advance_days', 'working_hours_start',
             'working_hours_end'
         ]
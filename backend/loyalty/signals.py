@@ -0,0 +1,12 @@
+# Обработчики сигналов бонусной программы
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from shop.models import Order
+from .models import BonusTransaction
+
+
+@receiver(post_save, sender=Order)
+def award_bonus_for_delivered_order(sender, instance, **kwargs):
+    # Начисляем баллы, когда заказ переходит в статус "Доставлен"
+    if instance.status == 'delivered':
+        BonusTransaction.award_for_order(instance)
@@ -0,0 +1,238 @@
+from datetime import timedelta
+from decimal import Decimal
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from accounts.models import User
+from shop.models import Order
+from .management.commands.generate_promo_codes import Command as GeneratePromoCodesCommand
+from .models import BonusBalance, BonusTransaction, PromoCode, Settings
+
+
+class PromoCodeRedeemTest(TestCase):
+    """
+    Погашение промокода: счетчик использований увеличивается условным
+    UPDATE и не превышает max_uses
+    """
+
+    def setUp(self):
+        now = timezone.now()
+        self.user = User.objects.create_user('buyer')
+        self.promo_code = PromoCode.objects.create(
+            code='SALE',
+            discount_percent=10,
+            max_uses=2,
+            valid_from=now - timedelta(days=1),
+            valid_until=now + timedelta(days=1),
+        )
+
+    def create_order(self, total_price=200):
+        return Order.objects.create(user=self.user, total_price=total_price)
+
+    def test_redeem_applies_discount(self):
+        order = self.create_order()
+        PromoCode.redeem('sale', order)
+        order.refresh_from_db()
+        self.assertEqual(order.promo_code_id, self.promo_code.pk)
+        self.assertEqual(order.total_price, Decimal('180'))
+        self.assertEqual(order.discount_amount, Decimal('20'))
+        self.promo_code.refresh_from_db()
+        self.assertEqual(self.promo_code.used_count, 1)
+
+    def test_max_uses_not_exceeded(self):
+        PromoCode.redeem('SALE', self.create_order())
+        PromoCode.redeem('SALE', self.create_order())
+        order = self.create_order()
+        with self.assertRaises(ValidationError):
+            PromoCode.redeem('SALE', order)
+        self.promo_code.refresh_from_db()
+        self.assertEqual(self.promo_code.used_count, 2)
+        # Заказ с отклоненным кодом остается без скидки
+        order.refresh_from_db()
+        self.assertIsNone(order.promo_code_id)
+        self.assertEqual(order.total_price, Decimal('200'))
+
+    def test_limit_checked_in_database(self):
+        # Код исчерпан другим процессом - лимит проверяется условием UPDATE
+        PromoCode.objects.filter(pk=self.promo_code.pk).update(used_count=2)
+        with self.assertRaises(ValidationError):
+            PromoCode.redeem('SALE', self.create_order())
+
+    def test_expired_and_inactive_codes_rejected(self):
+        PromoCode.objects.filter(pk=self.promo_code.pk).update(valid_until=timezone.now() - timedelta(minutes=1))
+        with self.assertRaises(ValidationError):
+            PromoCode.redeem('SALE', self.create_order())
+        PromoCode.objects.filter(pk=self.promo_code.pk).update(
+            valid_until=timezone.now() + timedelta(days=1), is_active=False
+        )
+        with self.assertRaises(ValidationError):
+            PromoCode.redeem('SALE', self.create_order())
+
+    def test_min_order_amount(self):
+        PromoCode.objects.filter(pk=self.promo_code.pk).update(min_order_amount=500)
+        with self.assertRaises(ValidationError):
+            PromoCode.redeem('SALE', self.create_order(total_price=200))
+        self.promo_code.refresh_from_db()
+        self.assertEqual(self.promo_code.used_count, 0)
+
+
+class PromoCodeCacheTest(TestCase):
+    """
+    Кэш промокодов и уникальность кода без учета регистра
+    """
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.promo_code = PromoCode.objects.create(
+            code='SALE', discount_percent=10, max_uses=5,
+            valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1),
+        )
+
+    def test_codes_differing_in_case_rejected(self):
+        with self.assertRaises(IntegrityError):
+            PromoCode.objects.create(
+                code='sale', max_uses=1,
+                valid_from=self.promo_code.valid_from, valid_until=self.promo_code.valid_until,
+            )
+
+    def test_generated_code_replaces_cached_miss(self):
+        # Код проверяли до генерации - в кэше лежит "не найдено"
+        self.assertIsNone(PromoCode.get_cached('WELCOME-1'))
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(GeneratePromoCodesCommand, '_make_code', return_value='WELCOME-1'):
+            call_command(
+                'generate_promo_codes', '1', '--pattern', 'WELCOME-X', '--discount-percent', '5',
+                '--output', os.path.join(directory, 'codes.csv'), stdout=StringIO(),
+            )
+        self.assertIsNotNone(PromoCode.get_cached('welcome-1'))
+
+    def test_rename_invalidates_old_code(self):
+        self.assertIsNotNone(PromoCode.get_cached('sale'))
+        self.assertIsNone(PromoCode.get_cached('SPRING'))
+        promo_code = PromoCode.objects.get(pk=self.promo_code.pk)
+        promo_code.code = 'SPRING'
+        with self.captureOnCommitCallbacks(execute=True):
+            promo_code.save()
+        self.assertIsNone(PromoCode.get_cached('SALE'))
+        self.assertEqual(PromoCode.get_cached('spring').pk, self.promo_code.pk)
+
+
+class ReconcileBonusBalancesTest(TestCase):
+    """
+    Команда reconcile_bonus_balances сверяет остатки с журналом
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('holder')
+        BonusTransaction.objects.create(user=self.user, points=100, transaction_type='earned')
+        BonusTransaction.objects.create(user=self.user, points=-30, transaction_type='spent')
+        # Остаток разошелся с журналом (например, правка в обход модели)
+        BonusBalance.objects.filter(user=self.user).update(
+            points=500, updated_at=timezone.now() - timedelta(days=10)
+        )
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_bonus_balances', *args, stdout=out)
+        return out.getvalue()
+
+    def test_report_only(self):
+        output = self.reconcile()
+        self.assertIn('в журнале 70, в остатке 500', output)
+        self.assertEqual(BonusBalance.get_points(self.user), 500)
+
+    def test_fix_corrects_drifted_balance(self):
+        started = timezone.now()
+        self.reconcile('--fix')
+        balance = BonusBalance.objects.get(user=self.user)
+        self.assertEqual(balance.points, 70)
+        self.assertGreaterEqual(balance.updated_at, started)
+        self.assertIn('Расхождений: 0', self.reconcile())
+
+    def test_missing_balance_created(self):
+        other = User.objects.create_user('no_balance')
+        BonusTransaction.objects.create(user=other, points=40, transaction_type='manual')
+        BonusBalance.objects.filter(user=other).delete()
+        self.reconcile('--fix')
+        self.assertEqual(BonusBalance.get_points(other), 40)
+
+
+class ExpireBonusPointsTest(TestCase):
+    """
+    Команда expire_bonus_points: сгорают только старые непотраченные
+    начисления, ручные начисления не сгорают
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('saver')
+        self.old_earned = self.add(self.user, 100, 'earned', days_ago=400)
+        self.add(self.user, 50, 'earned', days_ago=10)
+        self.add(self.user, -30, 'spent', days_ago=5)
+
+    @staticmethod
+    def add(user, points, transaction_type, days_ago=0):
+        entry = BonusTransaction.objects.create(user=user, points=points, transaction_type=transaction_type)
+        BonusTransaction.objects.filter(pk=entry.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return entry
+
+    def expire(self):
+        call_command('expire_bonus_points', '--days', '365', stdout=StringIO())
+
+    def test_expires_unspent_old_points(self):
+        self.expire()
+        # Остаток 120, из них 50 - свежие: сгорает 70 из старого начисления
+        expired = BonusTransaction.objects.get(source=self.old_earned)
+        self.assertEqual(expired.transaction_type, 'expired')
+        self.assertEqual(expired.points, -70)
+        self.assertEqual(BonusBalance.get_points(self.user), 50)
+
+    def test_rerun_is_idempotent(self):
+        self.expire()
+        self.expire()
+        self.assertEqual(BonusTransaction.objects.filter(transaction_type='expired').count(), 1)
+        self.assertEqual(BonusBalance.get_points(self.user), 50)
+
+    def test_manual_grants_do_not_expire(self):
+        user = User.objects.create_user('granted')
+        old_earned = self.add(user, 100, 'earned', days_ago=400)
+        self.add(user, -100, 'spent', days_ago=300)
+        self.add(user, 40, 'manual', days_ago=200)
+        self.expire()
+        self.assertEqual(BonusTransaction.objects.get(source=old_earned).points, 0)
+        self.assertEqual(BonusBalance.get_points(user), 40)
+
+    def test_balance_matches_ledger(self):
+        self.expire()
+        ledger = sum(BonusTransaction.objects.filter(user=self.user).values_list('points', flat=True))
+        self.assertEqual(BonusBalance.get_points(self.user), ledger)
+
+
+class SettingsViewTest(TestCase):
+    """
+    Настройки отдаются из кэша процесса и создаются, если их еще нет
+    """
+
+    def setUp(self):
+        cache.clear()
+        Settings.invalidate_cache()
+
+    def test_created_when_missing(self):
+        response = self.client.get('/api/loyalty/settings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertTrue(Settings.objects.filter(pk=1).exists())
+
+    def test_served_from_cache(self):
+        self.client.get('/api/loyalty/settings/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/loyalty/settings/').status_code, 200)
+            self.assertEqual(self.client.get('/api/loyalty/settings/1/').status_code, 200)
+        self.assertEqual(self.client.get('/api/loyalty/settings/2/').status_code, 404)
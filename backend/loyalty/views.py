@@ -1,8 +1,9 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import BonusTransaction, PromoCode, Settings
+from .models import BonusTransaction, BonusBalance, PromoCode, Settings
 from .serializers import (
     BonusTransactionSerializer, PromoCodeSerializer,
     PromoCodeValidateSerializer, SettingsSerializer
@@ -17,15 +18,14 @@ class BonusTransactionViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return BonusTransaction.objects.filter(user=self.request.user)  # booking removed
+        return BonusTransaction.objects.filter(user=self.request.user)
     
     @action(detail=False, methods=['get'])
     def balance(self, request):
-        # Система бонусных баллов удалена
+        # Остаток читается из BonusBalance, журнал целиком не суммируется
         return Response({
-            'balance': 0,
+            'balance': BonusBalance.get_points(request.user),
             'user': request.user.username,
-            'message': 'Система бонусных баллов отключена'
         })
 
 
@@ -66,9 +66,17 @@ class SettingsViewSet(viewsets.ReadOnlyModelViewSet):
     """
     serializer_class = SettingsSerializer
     permission_classes = [AllowAny]
+    # Фильтровать и сортировать одну запись незачем
+    filter_backends = []
     queryset = Settings.objects.all()
     
     def get_queryset(self):
-        # Возвращаем singleton
-        return Settings.objects.filter(pk=1) if Settings.objects.exists() else Settings.objects.none()
+        # Singleton из кэша процесса (создается, если настроек еще нет) - без запроса к базе
+        return [Settings.get_settings()]
+    
+    def get_object(self):
+        settings = Settings.get_settings()
+        if str(self.kwargs.get(self.lookup_field)) != str(settings.pk):
+            raise NotFound()
+        return settings
 
@@ -0,0 +1,145 @@
+# Гостевая корзина - хранится в сессии, пока пользователь не вошел в систему
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Product, ProductVariant, Cart, CartItem
+
+
+GUEST_CART_SESSION_KEY = 'guest_cart'
+
+
+class GuestCart:
+    """
+    Корзина неавторизованного пользователя.
+
+    Хранится в сессии в виде словаря {"<product_id>:<variant_id>": quantity},
+    поэтому одинаковые товары с одинаковым вариантом всегда лежат в одной строке.
+    """
+
+    def __init__(self, request):
+        self.session = request.session
+        self.lines = dict(self.session.get(GUEST_CART_SESSION_KEY, {}))
+
+    def __len__(self):
+        return len(self.lines)
+
+    @staticmethod
+    def _make_key(product_id, variant_id=None):
+        return f"{product_id}:{variant_id or ''}"
+
+    @staticmethod
+    def _parse_key(key):
+        product_id, _, variant_id = key.partition(':')
+        return int(product_id), int(variant_id) if variant_id else None
+
+    def _save(self):
+        self.session[GUEST_CART_SESSION_KEY] = self.lines
+        self.session.modified = True
+
+    def add(self, product_id, variant_id=None, quantity=1):
+        # Добавляет товар, суммируя количество с уже лежащим в корзине
+        key = self._make_key(product_id, variant_id)
+        self.lines[key] = self.lines.get(key, 0) + quantity
+        self._save()
+
+    def clear(self):
+        self.lines = {}
+        self.session.pop(GUEST_CART_SESSION_KEY, None)
+
+    def quantities(self):
+        # Возвращает {(product_id, variant_id): quantity}
+        return {self._parse_key(key): quantity for key, quantity in self.lines.items()}
+
+    def build_items(self):
+        """
+        Собирает несохраненные CartItem для сериализации.
+        Товары и варианты загружаются одним запросом на каждую таблицу,
+        недоступные позиции пропускаются.
+        """
+        quantities = self.quantities()
+        product_ids = {product_id for product_id, _ in quantities}
+        variant_ids = {variant_id for _, variant_id in quantities if variant_id}
+        products = Product.objects.filter(
+            id__in=product_ids, is_available=True
+        ).select_related('category').prefetch_related('variants').in_bulk()
+        variants = ProductVariant.objects.filter(
+            id__in=variant_ids, is_available=True
+        ).in_bulk()
+
+        items = []
+        for (product_id, variant_id), quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            variant = None
+            if variant_id:
+                variant = variants.get(variant_id)
+                if variant is None or variant.product_id != product_id:
+                    continue
+                variant.product = product
+            items.append(CartItem(product=product, variant=variant, quantity=quantity))
+        return items
+
+
+def merge_guest_cart(request, user):
+    """
+    Переносит гостевую корзину из сессии в корзину пользователя.
+
+    Количество одинаковых позиций (товар, вариант) суммируется.
+    Все изменения выполняются пакетно: один запрос на чтение существующих
+    позиций, один bulk_update и один bulk_create.
+    """
+    guest_cart = GuestCart(request)
+    if not guest_cart:
+        return
+
+    quantities = guest_cart.quantities()
+    product_ids = {product_id for product_id, _ in quantities}
+    variant_ids = {variant_id for _, variant_id in quantities if variant_id}
+    available_products = set(
+        Product.objects.filter(id__in=product_ids, is_available=True).values_list('id', flat=True)
+    )
+    available_variants = set(
+        ProductVariant.objects.filter(id__in=variant_ids, is_available=True).values_list('id', 'product_id')
+    )
+    quantities = {
+        (product_id, variant_id): quantity
+        for (product_id, variant_id), quantity in quantities.items()
+        if product_id in available_products
+        and (variant_id is None or (variant_id, product_id) in available_variants)
+    }
+
+    with transaction.atomic():
+        # Блокируем корзину, чтобы параллельный вход не задвоил позиции,
+        # а cleanup_carts не удалил ее до коммита
+        cart = Cart.get_locked_for_user(user)
+
+        existing = {
+            (item.product_id, item.variant_id): item
+            for item in CartItem.objects.filter(cart=cart, product_id__in=available_products)
+        }
+        now = timezone.now()
+        to_update = []
+        to_create = []
+        for (product_id, variant_id), quantity in quantities.items():
+            item = existing.get((product_id, variant_id))
+            if item:
+                item.quantity += quantity
+                item.updated_at = now
+                to_update.append(item)
+            else:
+                to_create.append(CartItem(
+                    cart=cart,
+                    product_id=product_id,
+                    variant_id=variant_id,
+                    quantity=quantity
+                ))
+
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if to_update or to_create:
+            Cart.objects.filter(pk=cart.pk).update(version=F('version') + 1, updated_at=now)
+
+    guest_cart.clear()
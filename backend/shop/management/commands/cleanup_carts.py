@@ -0,0 +1,120 @@
+"""
+Management команда для очистки корзин
+
+Удаляет корзины, которые не менялись дольше срока хранения, и убирает
+из остальных корзин недоступные товары и варианты.
+
+Удаление идет порциями: id порции выбираются одним запросом, затем строки
+удаляются одним DELETE ... WHERE id IN (...) без загрузки в Python,
+чтобы не держать долгие блокировки на таблицах корзины.
+
+Использование:
+    python manage.py cleanup_carts [--days N] [--batch-size N] [--dry-run]
+
+Примеры:
+    python manage.py cleanup_carts
+    python manage.py cleanup_carts --days 60 --batch-size 500
+"""
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from shop.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = 'Удаляет заброшенные корзины и недоступные товары из корзин'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Через сколько дней без изменений корзина считается заброшенной (по умолчанию: 30)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк удалять за один запрос (по умолчанию: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, что будет удалено, ничего не удаляя'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(days=days)
+
+        idle_carts = Cart.objects.filter(updated_at__lt=cutoff)
+        idle_items = CartItem.objects.filter(cart__updated_at__lt=cutoff)
+        unavailable_items = CartItem.objects.filter(
+            Q(product__is_available=False) | Q(variant__is_available=False),
+            cart__updated_at__gte=cutoff
+        )
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Пробный запуск - данные не удаляются'))
+            self.stdout.write(f'Заброшенных корзин: {idle_carts.count()} (товаров в них: {idle_items.count()})')
+            self.stdout.write(f'Недоступных товаров в корзинах: {unavailable_items.count()}')
+            return
+
+        started = time.monotonic()
+
+        removed_carts, removed_idle_items = self._delete_idle_carts(cutoff, batch_size)
+        removed_unavailable = self._delete_unavailable_items(unavailable_items, batch_size)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Удалено заброшенных корзин: {removed_carts} (товаров в них: {removed_idle_items})'))
+        self.stdout.write(self.style.SUCCESS(f'Удалено недоступных товаров из корзин: {removed_unavailable}'))
+        self.stdout.write(f'Время выполнения: {elapsed:.2f} с')
+
+    def _delete_idle_carts(self, cutoff, batch_size):
+        """
+        Удаляет заброшенные корзины порциями. В одной транзакции:
+        блокируем порцию корзин (с повторной проверкой updated_at - добавление
+        товара обновляет его и ждет нашей блокировки), удаляем их товары
+        и сами корзины. Возвращает (корзин, товаров).
+        """
+        removed_carts = 0
+        removed_items = 0
+        while True:
+            with transaction.atomic():
+                cart_ids = list(
+                    Cart.objects.select_for_update(skip_locked=True).filter(
+                        updated_at__lt=cutoff
+                    ).order_by('pk').values_list('pk', flat=True)[:batch_size]
+                )
+                if not cart_ids:
+                    return removed_carts, removed_items
+                # _raw_delete - один DELETE без загрузки строк и каскада в Python
+                items = CartItem.objects.filter(cart_id__in=cart_ids)
+                removed_items += items._raw_delete(items.db)
+                carts = Cart.objects.filter(pk__in=cart_ids, updated_at__lt=cutoff)
+                removed_carts += carts._raw_delete(carts.db)
+            if len(cart_ids) < batch_size:
+                return removed_carts, removed_items
+
+    def _delete_unavailable_items(self, queryset, batch_size):
+        """
+        Удаляет недоступные товары из корзин порциями по batch_size.
+        Возвращает общее количество удаленных товаров.
+        """
+        total = 0
+        while True:
+            with transaction.atomic():
+                item_ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not item_ids:
+                    return total
+                # Клиенты с ?version=N должны увидеть, что корзина изменилась
+                Cart.objects.filter(items__pk__in=item_ids).update(version=F('version') + 1)
+                items = CartItem.objects.filter(pk__in=item_ids)
+                total += items._raw_delete(items.db)
+            if len(item_ids) < batch_size:
+                return total
@@ -0,0 +1,17 @@
+# Generated manually
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_create_cart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Увеличивается при каждом изменении состава корзины', verbose_name='Версия'),
+        ),
+    ]
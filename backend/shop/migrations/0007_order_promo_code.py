@@ -0,0 +1,25 @@
+# Generated manually
+from django.db import migrations, models
+import django.db.models.deletion
+import django.core.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loyalty', '0001_initial'),
+        ('shop', '0006_cart_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='promo_code',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='loyalty.promocode', verbose_name='Промокод'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Скидка по промокоду'),
+        ),
+    ]
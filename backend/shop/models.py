@@ -300,6 +300,21 @@ class Order(models.Model):
         validators=[MinValueValidator(0)],
         verbose_name='Итоговая цена'
     )
+    promo_code = models.ForeignKey(
+        'loyalty.PromoCode',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='orders',
+        verbose_name='Промокод'
+    )
+    discount_amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name='Скидка по промокоду'
+    )
     notes = models.TextField(
         blank=True,
         null=True,
@@ -449,6 +464,11 @@ class Cart(models.Model):
         related_name='cart',
         verbose_name='Пользователь'
     )
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Версия',
+        help_text='Увеличивается при каждом изменении состава корзины'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата создания'
@@ -480,6 +500,45 @@ class Cart(models.Model):
             item_price = item.variant.final_price if item.variant else item.product.price
             total += item_price * item.quantity
         return total
+    
+    def get_totals(self):
+        # Считает количество и стоимость корзины одним запросом к базе
+        from django.db.models import DecimalField, F, Sum, Value
+        from django.db.models.functions import Coalesce
+        price = F('product__price') + Coalesce(
+            F('variant__price_modifier'), Value(0), output_field=DecimalField()
+        )
+        totals = self.items.aggregate(
+            total_items=Sum('quantity'),
+            total_price=Sum(F('quantity') * price, output_field=DecimalField(max_digits=10, decimal_places=2))
+        )
+        return {
+            'total_items': totals['total_items'] or 0,
+            'total_price': totals['total_price'] or 0,
+        }
+    
+    @classmethod
+    def get_locked_for_user(cls, user):
+        """
+        Корзина пользователя, заблокированная до конца текущей транзакции
+        (вызывать внутри transaction.atomic()). cleanup_carts пропускает
+        заблокированные корзины; если корзину удалили между чтением
+        и блокировкой, создается новая.
+        """
+        while True:
+            cart, created = cls.objects.get_or_create(user=user)
+            if created:
+                return cart
+            cart = cls.objects.select_for_update().filter(pk=cart.pk).first()
+            if cart is not None:
+                return cart
+    
+    def bump_version(self):
+        # Атомарно увеличивает версию корзины после изменения ее состава
+        from django.db.models import F
+        from django.utils import timezone
+        Cart.objects.filter(pk=self.pk).update(version=F('version') + 1, updated_at=timezone.now())
+        self.refresh_from_db(fields=['version', 'updated_at'])
 
 
 # Товары в корзине
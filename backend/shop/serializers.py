@@ -89,15 +89,16 @@ class OrderItemSerializer(serializers.ModelSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     user = serializers.StringRelatedField(read_only=True)
+    promo_code = serializers.SlugRelatedField(slug_field='code', read_only=True)
     
     class Meta:
         model = Order
         fields = [
             'id', 'user', 'status', 'delivery_method', 'delivery_address',
             'customer_first_name', 'customer_last_name', 'customer_middle_name', 'customer_phone',
-            'total_price', 'notes', 'items', 'created_at', 'updated_at'
+            'total_price', 'promo_code', 'discount_amount', 'notes', 'items', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'total_price', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'total_price', 'promo_code', 'discount_amount', 'created_at', 'updated_at']
 
 
 # Сериализатор для создания нового заказа
@@ -109,6 +110,7 @@ class CreateOrderSerializer(serializers.Serializer):
     customer_middle_name = serializers.CharField(required=False, allow_blank=True, max_length=100)
     customer_phone = serializers.CharField(max_length=20)
     notes = serializers.CharField(required=False, allow_blank=True)
+    promo_code = serializers.CharField(required=False, allow_blank=True, max_length=50)
     items = serializers.ListField(
         child=serializers.DictField(
             child=serializers.IntegerField()
@@ -149,6 +151,10 @@ class CreateOrderSerializer(serializers.Serializer):
         )
         
         return order
+    
+    def to_representation(self, instance):
+        # После создания возвращаем заказ в обычном формате, с позициями и скидкой
+        return OrderSerializer(instance, context=self.context).data
 
 
 # Сериализаторы для корзины
@@ -186,8 +192,26 @@ class CartSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Cart
-        fields = ['id', 'items', 'total_items', 'total_price', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'total_items', 'total_price', 'created_at', 'updated_at']
+        fields = ['id', 'items', 'total_items', 'total_price', 'version', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'total_items', 'total_price', 'version', 'created_at', 'updated_at']
+
+
+# Сериализатор для ответа на изменение корзины в режиме ?delta=true -
+# только измененная позиция, новые итоги и версия корзины
+class CartDeltaSerializer(serializers.Serializer):
+    item = CartItemSerializer(read_only=True, allow_null=True)
+    removed_item_id = serializers.IntegerField(read_only=True, allow_null=True)
+    total_items = serializers.IntegerField(read_only=True)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    version = serializers.IntegerField(read_only=True)
+
+
+# Сериализатор для гостевой корзины из сессии - формат совпадает с CartSerializer
+class GuestCartSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True, allow_null=True)
+    items = CartItemSerializer(many=True, read_only=True)
+    total_items = serializers.IntegerField(read_only=True)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
 
 # Сериализатор для добавления товара в корзину
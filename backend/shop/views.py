@@ -3,14 +3,34 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
 from django_filters.rest_framework import DjangoFilterBackend
+from loyalty.models import PromoCode
 from .models import ProductCategory, Product, Order, OrderItem, Shop, Cart, CartItem
 from .serializers import (
     ProductCategorySerializer, ProductSerializer,
     OrderSerializer, OrderItemSerializer, CreateOrderSerializer,
-    ShopSerializer, CartSerializer, CartItemSerializer,
-    AddToCartSerializer, UpdateCartItemSerializer
+    ShopSerializer, CartSerializer, CartItemSerializer, GuestCartSerializer,
+    CartDeltaSerializer, AddToCartSerializer, UpdateCartItemSerializer
 )
+from .guest_cart import GuestCart
+
+
+def is_delta_request(request):
+    # Клиент просит вернуть только изменения корзины: ?delta=true
+    return request.query_params.get('delta', 'false').lower() == 'true'
+
+
+def build_cart_delta(request, cart, item=None, removed_item_id=None):
+    # Ответ на изменение корзины: измененная позиция, итоги и новая версия
+    return CartDeltaSerializer({
+        'item': item,
+        'removed_item_id': removed_item_id,
+        'version': cart.version,
+        **cart.get_totals(),
+    }, context={'request': request}).data
 
 
 # API для категорий товаров - только чтение
@@ -57,21 +77,25 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_staff or user.is_superuser:
-            return Order.objects.all().select_related('user').prefetch_related('items__product')
+            return Order.objects.all().select_related('user', 'promo_code').prefetch_related('items__product')
         else:
-            return Order.objects.filter(user=user).select_related('user').prefetch_related('items__product')
+            return Order.objects.filter(user=user).select_related('user', 'promo_code').prefetch_related('items__product')
     
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateOrderSerializer
         return OrderSerializer
     
+    @transaction.atomic
     def perform_create(self, serializer):
         # Создаем заказ с товарами
+        # Все в одной транзакции: если промокод не удалось погасить, заказ не создается
         items_data = serializer.validated_data.pop('items', [])
+        promo_code = serializer.validated_data.pop('promo_code', '').strip()
         order = serializer.save(
             user=self.request.user, 
-            status='pending'
+            status='pending',
+            total_price=0  # Пересчитывается ниже по товарам заказа
         )
         
         total_price = 0
@@ -91,6 +115,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         order.total_price = total_price
         order.save()
+        
+        if promo_code:
+            try:
+                PromoCode.redeem(promo_code, order)
+            except DjangoValidationError as e:
+                raise ValidationError({'promo_code': e.messages})
     
     @action(detail=True, methods=['patch'], permission_classes=[IsAdminUser])
     def status(self, request, pk=None):
@@ -125,10 +155,20 @@ class ShopViewSet(viewsets.ModelViewSet):
 
 
 # API для корзины пользователя
+# Неавторизованные пользователи работают с гостевой корзиной в сессии,
+# которая переносится в корзину пользователя при входе или регистрации
 class CartViewSet(viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
     
+    def get_permissions(self):
+        """
+        Просмотр, добавление и очистка доступны и гостям (корзина в сессии)
+        """
+        if self.action in ['list', 'add_item', 'clear']:
+            return [AllowAny()]
+        return [IsAuthenticated()]
+    
     def get_queryset(self):
         # Каждый пользователь видит только свою корзину
         cart, created = Cart.objects.get_or_create(user=self.request.user)
@@ -139,22 +179,33 @@ class CartViewSet(viewsets.ModelViewSet):
         cart, created = Cart.objects.get_or_create(user=self.request.user)
         return cart
     
+    def get_guest_cart_data(self, request):
+        # Сериализует гостевую корзину в том же формате, что и обычную
+        items = GuestCart(request).build_items()
+        return GuestCartSerializer({
+            'id': None,
+            'items': items,
+            'total_items': sum(item.quantity for item in items),
+            'total_price': sum(item.total_price for item in items),
+        }, context={'request': request}).data
+    
     def list(self, request, *args, **kwargs):
         # GET /api/shop/cart/ - получить корзину пользователя
+        if not request.user.is_authenticated:
+            return Response(self.get_guest_cart_data(request))
         cart = self.get_object()
+        # ?version=N - клиент уже знает актуальную корзину, отдаем ее только если версия устарела
+        client_version = request.query_params.get('version')
+        if client_version is not None and client_version == str(cart.version):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['post'])
-    def add_item(self, request):
-        # POST /api/shop/cart/add_item/ - добавить товар в корзину
-        serializer = AddToCartSerializer(data=request.data)
-        if serializer.is_valid():
-            cart, created = Cart.objects.get_or_create(user=request.user)
-            product_id = serializer.validated_data['product_id']
-            variant_id = serializer.validated_data.get('variant_id')
-            quantity = serializer.validated_data.get('quantity', 1)
-            
+    @staticmethod
+    def add_to_cart(user, product_id, variant_id, quantity):
+        # Добавляет товар в заблокированную корзину: удалить ее до коммита нельзя
+        with transaction.atomic():
+            cart = Cart.get_locked_for_user(user)
             # Проверяем, есть ли уже такой товар в корзине
             cart_item, created = CartItem.objects.get_or_create(
                 cart=cart,
@@ -162,11 +213,36 @@ class CartViewSet(viewsets.ModelViewSet):
                 variant_id=variant_id,
                 defaults={'quantity': quantity}
             )
-            
             if not created:
                 # Товар уже есть, увеличиваем количество
                 cart_item.quantity += quantity
                 cart_item.save()
+            cart.bump_version()
+        return cart, cart_item
+    
+    @action(detail=False, methods=['post'])
+    def add_item(self, request):
+        # POST /api/shop/cart/add_item/ - добавить товар в корзину
+        serializer = AddToCartSerializer(data=request.data)
+        if serializer.is_valid():
+            product_id = serializer.validated_data['product_id']
+            variant_id = serializer.validated_data.get('variant_id')
+            quantity = serializer.validated_data.get('quantity', 1)
+            
+            if not request.user.is_authenticated:
+                # Гость - сохраняем товар в сессии
+                GuestCart(request).add(product_id, variant_id, quantity)
+                return Response(self.get_guest_cart_data(request), status=status.HTTP_200_OK)
+            
+            try:
+                cart, cart_item = self.add_to_cart(request.user, product_id, variant_id, quantity)
+            except IntegrityError:
+                # Корзину удалили (cleanup_carts, слияние корзин) во время добавления -
+                # повторяем с заново найденной или созданной корзиной
+                cart, cart_item = self.add_to_cart(request.user, product_id, variant_id, quantity)
+            
+            if is_delta_request(request):
+                return Response(build_cart_delta(request, cart, item=cart_item), status=status.HTTP_200_OK)
             
             # Возвращаем обновленную корзину
             cart_serializer = CartSerializer(cart, context={'request': request})
@@ -177,8 +253,12 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['delete'])
     def clear(self, request):
         # DELETE /api/shop/cart/clear/ - очистить корзину
+        if not request.user.is_authenticated:
+            GuestCart(request).clear()
+            return Response({'message': 'Корзина очищена'}, status=status.HTTP_200_OK)
         cart, created = Cart.objects.get_or_create(user=request.user)
         cart.items.all().delete()
+        cart.bump_version()
         return Response({'message': 'Корзина очищена'}, status=status.HTTP_200_OK)
 
 
@@ -190,25 +270,30 @@ class CartItemViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Получаем корзину пользователя
         cart, created = Cart.objects.get_or_create(user=self.request.user)
-        return CartItem.objects.filter(cart=cart).select_related('product', 'variant')
+        return CartItem.objects.filter(cart=cart).select_related('cart', 'product', 'variant')
     
     def destroy(self, request, *args, **kwargs):
         # DELETE /api/shop/cart/items/{id}/ - удалить товар из корзины
         instance = self.get_object()
         # Проверяем, что товар принадлежит корзине текущего пользователя
-        if instance.cart.user != request.user:
+        if instance.cart.user_id != request.user.id:
             return Response(
                 {'error': 'Нет доступа к этому товару'},
                 status=status.HTTP_403_FORBIDDEN
             )
+        cart = instance.cart
+        removed_item_id = instance.id
         self.perform_destroy(instance)
+        cart.bump_version()
+        if is_delta_request(request):
+            return Response(build_cart_delta(request, cart, removed_item_id=removed_item_id))
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     def update(self, request, *args, **kwargs):
         # PATCH /api/shop/cart/items/{id}/ - обновить количество товара
         instance = self.get_object()
         # Проверяем, что товар принадлежит корзине текущего пользователя
-        if instance.cart.user != request.user:
+        if instance.cart.user_id != request.user.id:
             return Response(
                 {'error': 'Нет доступа к этому товару'},
                 status=status.HTTP_403_FORBIDDEN
@@ -217,7 +302,10 @@ class CartItemViewSet(viewsets.ModelViewSet):
         serializer = UpdateCartItemSerializer(data=request.data)
         if serializer.is_valid():
             instance.quantity = serializer.validated_data['quantity']
-            instance.save()
+            instance.save(update_fields=['quantity', 'updated_at'])
+            instance.cart.bump_version()
+            if is_delta_request(request):
+                return Response(build_cart_delta(request, instance.cart, item=instance))
             cart_serializer = CartSerializer(instance.cart, context={'request': request})
             return Response(cart_serializer.data)
         
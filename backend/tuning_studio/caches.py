@@ -0,0 +1,13 @@
+# Свойства бэкендов кэша, на которые опираются системные проверки приложений
+from django.conf import settings
+
+
+# Кэши, которые видны только внутри одного процесса
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_cache_backend(alias='default'):
+    return settings.CACHES.get(alias, {}).get('BACKEND', LOCAL_CACHE_BACKENDS[0])
@@ -0,0 +1,100 @@
+# Отслеживание измененных полей модели без лишних запросов к базе
+from django.db import models
+
+
+def _comparable(value):
+    # Файловые поля сравниваем по имени файла (в базе хранится только имя)
+    if isinstance(value, models.fields.files.FieldFile):
+        return value.name or None
+    return value
+
+
+class DirtyFieldsMixin:
+    """
+    Миксин для моделей: запоминает значения полей при загрузке из базы
+    (from_db) и после каждого сохранения.
+
+    - get_dirty_fields() / is_dirty(name) - какие поля изменились с тех пор;
+    - save() без update_fields у загруженного объекта сохраняет только
+      измененные поля (и поля auto_now). Если ничего не изменилось,
+      выполняется обычное сохранение всех полей - с сигналами и auto_now.
+
+    Отложенное поле (only/defer), которому присвоили значение, считается
+    измененным: его прежнее значение неизвестно.
+
+    Миксин указывается перед models.Model: class Car(DirtyFieldsMixin, models.Model).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def _snapshot_fields(self, field_names=None):
+        """
+        Запоминаем значения загруженных (не отложенных) полей.
+        Если указаны field_names - обновляем только эти поля.
+        """
+        deferred = self.get_deferred_fields()
+        if field_names is None or getattr(self, '_loaded_values', None) is None:
+            self._loaded_values = {}
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred:
+                continue
+            if field_names is None or field.name in field_names or field.attname in field_names:
+                self._loaded_values[field.attname] = _comparable(getattr(self, field.attname))
+
+    def get_dirty_fields(self):
+        """
+        Имена полей, значения которых отличаются от загруженных.
+        Для объекта, который еще не загружался и не сохранялся, - None.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        dirty = set()
+        for field in self._meta.concrete_fields:
+            if field.attname in loaded:
+                if _comparable(getattr(self, field.attname)) != loaded[field.attname]:
+                    dirty.add(field.name)
+            elif field.attname in self.__dict__:
+                # Отложенное поле, которому присвоили значение
+                dirty.add(field.name)
+        return dirty
+
+    def get_loaded_value(self, field_name, default=None):
+        """
+        Значение поля на момент загрузки или последнего сохранения.
+        В обработчиках post_save - значение до текущего сохранения.
+        Для отложенного поля - default.
+        """
+        loaded = getattr(self, '_loaded_values', None) or {}
+        return loaded.get(self._meta.get_field(field_name).attname, default)
+
+    def is_dirty(self, field_name):
+        dirty = self.get_dirty_fields()
+        return dirty is None or field_name in dirty
+
+    def save(self, *args, **kwargs):
+        dirty = self.get_dirty_fields()
+        narrow = (
+            dirty
+            and not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        )
+        if narrow:
+            # Поля auto_now обновляются при каждом сохранении
+            kwargs['update_fields'] = dirty | {
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            }
+        super().save(*args, **kwargs)
+        # Несохраненные изменения (если update_fields задан вручную) остаются "грязными"
+        self._snapshot_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_fields(fields)
@@ -0,0 +1,84 @@
+# Пагинация по ключу для лент
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация "по ключу" для лент, отсортированных от новых к старым.
+
+    Следующая страница начинается сразу после последней записи предыдущей:
+    WHERE created_at <= X AND (created_at < X OR id < Y) ORDER BY created_at DESC, id DESC.
+    В отличие от OFFSET, стоимость запроса не растет с номером страницы
+    (при индексе по (-created_at, -id)), а новые записи не сдвигают страницы.
+
+    Ответ: {"next": ссылка или null, "results": [...]}
+    """
+    page_size = 20
+    max_page_size = 50
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    # Поле времени и уникальное поле, разрешающее одинаковое время
+    ordering_field = 'created_at'
+    tiebreaker_field = 'id'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, instance):
+        value = getattr(instance, self.ordering_field).isoformat()
+        raw = f'{value}|{getattr(instance, self.tiebreaker_field)}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            value, key = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            value = parse_datetime(value)
+            key = int(key)
+        except (ValueError, UnicodeDecodeError):
+            value = None
+        if value is None:
+            raise NotFound('Неверный курсор')
+        return value, key
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(f'-{self.ordering_field}', f'-{self.tiebreaker_field}')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, key = self.decode_cursor(cursor)
+            # Первое условие позволяет базе начать сканирование индекса с нужного места
+            queryset = queryset.filter(**{f'{self.ordering_field}__lte': value}).filter(
+                Q(**{f'{self.ordering_field}__lt': value})
+                | Q(**{self.ordering_field: value, f'{self.tiebreaker_field}__lt': key})
+            )
+
+        # Одна лишняя запись показывает, есть ли следующая страница
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
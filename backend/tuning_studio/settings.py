@@ -2,6 +2,7 @@
 Django settings for tuning_studio project.
 """
 
+import sys
 from pathlib import Path
 from decouple import config
 
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     'shop',
     'events',
     'forum',
+    'loyalty',
 ]
 
 MIDDLEWARE = [
@@ -91,6 +93,39 @@ DATABASES = {
 }
 
 
+# Кэш: в нем хранятся сессии, пользователи сессий, версии настроек и подсказок.
+# По умолчанию - LocMemCache (у каждого процесса свой, подходит для
+# разработки). Для одного сервера с несколькими процессами - файловый кэш
+# (каталог в /dev/shm держит его в памяти), для нескольких серверов -
+# Redis или Memcached, например:
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   CACHE_LOCATION=/dev/shm/tuning_studio_cache
+# или
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   CACHE_LOCATION=redis://127.0.0.1:6379/1
+# Тесты всегда идут на LocMemCache: общий кэш переживает пересоздание
+# тестовой базы и между запусками отдавал бы устаревшие записи.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    }
+}
+if TESTING:
+    CACHES['default'].update(BACKEND='django.core.cache.backends.locmem.LocMemCache', LOCATION='tests')
+
+# Сессии: cached_db читает сессию из кэша и пишет и в кэш, и в базу -
+# при сбросе кэша сессии не теряются. Можно заменить на
+# django.contrib.sessions.backends.cache (только кэш) или .db (только база).
+# Просроченные сессии удаляет команда purge_expired_sessions.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -142,10 +177,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Пользователь сессии загружается из кэша (accounts/user_cache.py).
+# ModelBackend нужен только для сессий, созданных до CachedUserBackend
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.CachedUserBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
+        # Для API-клиентов без cookie: Authorization: Bearer <токен> (accounts/tokens.py)
+        'accounts.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -157,6 +201,14 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Корзины токенов для входа и регистрации (accounts/throttling.py):
+    # не больше N попыток подряд, корзина пополняется на N токенов за период равномерно
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('THROTTLE_LOGIN_IP', default='20/min'),
+        'login_username': config('THROTTLE_LOGIN_USERNAME', default='5/min'),
+        'register_ip': config('THROTTLE_REGISTER_IP', default='5/hour'),
+        'register_username': config('THROTTLE_REGISTER_USERNAME', default='5/hour'),
+    },
 }
 
 # CORS settings (для разработки)
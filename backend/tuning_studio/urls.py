@@ -15,6 +15,7 @@ urlpatterns = [
     path('api/shop/', include('shop.urls')),
     path('api/events/', include('events.urls')),
     path('api/forum/', include('forum.urls')),
+    path('api/loyalty/', include('loyalty.urls')),
 ]
 
 if settings.DEBUG:
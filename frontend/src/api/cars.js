@@ -101,6 +101,20 @@ export const addCarPhoto = (carId, photoFile, isPrimary = false) => {
   return apiClient.post('/auth/car-photos/', formData)
 }
 
+/**
+ * Добавить несколько фото к автомобилю одним запросом
+ * primaryIndex - номер фото, которое станет основным (необязательно)
+ */
+export const addCarPhotos = (carId, photoFiles, primaryIndex = null) => {
+  const formData = new FormData()
+  photoFiles.forEach(file => formData.append('photos', file))
+  formData.append('car', carId)
+  if (primaryIndex !== null) {
+    formData.append('primary_index', primaryIndex)
+  }
+  return apiClient.post('/auth/car-photos/bulk_upload/', formData)
+}
+
 /**
  * Удалить фото автомобиля
  */
@@ -115,3 +129,28 @@ export const setPrimaryPhoto = (photoId) => {
   return apiClient.patch(`/auth/car-photos/${photoId}/`, { is_primary: true })
 }
 
+
+/**
+ * Подсказки марки, модели или поколения по началу строки
+ * field - 'brand', 'model' или 'generation'
+ */
+export const getCarAutocomplete = (field, query, { brand, model } = {}) => {
+  const params = { field, q: query }
+  if (brand) params.brand = brand
+  if (model) params.model = model
+  return apiClient.get('/auth/car-stats/autocomplete/', { params }).then(res => res.data.results)
+}
+
+/**
+ * Общая галерея машин сообщества
+ * cursor - значение из ссылки next предыдущей страницы
+ * Ответ: { next, results: [{ id, brand, model, generation, year, color, thumbnail_url, owner, created_at }] }
+ * thumbnail_url - миниатюра основного фото (до 400x300); пока фото обрабатывается - оригинал
+ */
+export const getCarGallery = ({ cursor, brand, generation } = {}) => {
+  const params = {}
+  if (cursor) params.cursor = cursor
+  if (brand) params.brand = brand
+  if (generation) params.generation = generation
+  return apiClient.get('/auth/car-gallery/', { params }).then(res => res.data)
+}
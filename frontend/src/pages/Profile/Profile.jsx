@@ -1146,10 +1146,10 @@ const Profile = () => {
                   {car.primary_photo_url || car.photo_url ? (
                     <div className="car-photo">
                       <img src={car.primary_photo_url || car.photo_url} alt={`${car.brand} ${car.model}`} />
-                      {car.photos && car.photos.length > 0 && (
+                      {(car.photos_count ?? car.photos?.length) > 0 && (
                         <div className="photo-count-badge">
                           <i className="fa fa-camera" aria-hidden="true"></i>
-                          {car.photos.length}
+                          {car.photos_count ?? car.photos.length}
                         </div>
                       )}
                     </div>